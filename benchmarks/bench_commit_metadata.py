@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from commit_metadata import read_commit_metadata
+
+
+# Previous approach of part2.py: one `git log` and one `git rev-list` subprocess per commit
+def read_with_subprocesses(repo_path, commit_shas):
+    metadata = {}
+    for commit_sha in commit_shas:
+        message = subprocess.run(["git", "-C", repo_path, "log", "--format=%B", "-n", "1", commit_sha],
+                                 capture_output=True, text=True, encoding='utf-8').stdout.strip()
+        parents = subprocess.run(["git", "-C", repo_path, "rev-list", "--parents", "-n", "1", commit_sha],
+                                 capture_output=True, text=True, encoding='utf-8').stdout.split()[1:]
+        metadata[commit_sha] = {"message": message, "parents": parents}
+    return metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-commit git subprocesses with the batched reader")
+    parser.add_argument("repo_path", help="path of a local git repository")
+    parser.add_argument("--commits", type=int, default=1000, help="number of commits to read")
+    args = parser.parse_args()
+
+    commit_shas = subprocess.run(["git", "-C", args.repo_path, "rev-list", "-n", str(args.commits), "HEAD"],
+                                 capture_output=True, text=True, encoding='utf-8').stdout.split()
+
+    start = time.perf_counter()
+    expected = read_with_subprocesses(args.repo_path, commit_shas)
+    subprocess_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = read_commit_metadata(args.repo_path, commit_shas)
+    batched_seconds = time.perf_counter() - start
+
+    # Both approaches have to agree on what they read
+    mismatches = [commit_sha for commit_sha in commit_shas
+                  if expected[commit_sha]["message"] != batched[commit_sha]["message"]
+                  or expected[commit_sha]["parents"] != batched[commit_sha]["parents"]]
+
+    print(f"Commits read:          {len(commit_shas)}")
+    print(f"Per-commit subprocess: {subprocess_seconds:.3f}s ({len(commit_shas) / subprocess_seconds:.0f} commits/s)")
+    print(f"Batched cat-file:      {batched_seconds:.3f}s ({len(commit_shas) / batched_seconds:.0f} commits/s)")
+    print(f"Speedup:               {subprocess_seconds / batched_seconds:.1f}x")
+    print(f"Mismatches:            {len(mismatches)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# Previous approach of part2.py: one RepositoryMining(single=...) per refactoring commit
+def read_one_by_one(repo_path, commit_shas):
+    from pydriller import RepositoryMining
+    files = 0
+    for commit_sha in commit_shas:
+        for commit in RepositoryMining(repo_path, single=commit_sha).traverse_commits():
+            files += sum(1 for modified_file in commit.modifications if modified_file.diff is not None)
+    return files
+
+
+def read_in_one_traversal(repo_path, commit_shas):
+    from part2 import iter_commits
+    return sum(1 for commit in iter_commits(repo_path, commit_shas)
+               for modified_file in commit.modifications if modified_file.diff is not None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-commit RepositoryMining with one ordered traversal")
+    parser.add_argument("repo_path", help="path of a local git repository")
+    parser.add_argument("--commits", type=int, default=200, help="number of commits to extract")
+    args = parser.parse_args()
+    repo_path = os.path.abspath(args.repo_path)
+
+    # part2 creates its output folders on import, keep them out of the working tree
+    os.chdir(tempfile.mkdtemp())
+
+    commit_shas = subprocess.run(["git", "-C", repo_path, "rev-list", "-n", str(args.commits), "HEAD"],
+                                 capture_output=True, text=True, encoding='utf-8').stdout.split()
+
+    start = time.perf_counter()
+    expected_files = read_one_by_one(repo_path, commit_shas)
+    single_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    traversal_files = read_in_one_traversal(repo_path, commit_shas)
+    traversal_seconds = time.perf_counter() - start
+
+    print(f"Commits extracted: {len(commit_shas)}")
+    print(f"Per-commit mining: {single_seconds:.3f}s "
+          f"({single_seconds / len(commit_shas) * 1000:.2f} ms/commit, {expected_files} files)")
+    print(f"Single traversal:  {traversal_seconds:.3f}s "
+          f"({traversal_seconds / len(commit_shas) * 1000:.2f} ms/commit, {traversal_files} files)")
+    print(f"Speedup:           {single_seconds / traversal_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_repo import create_repository
+
+# Stages run in order on every synthetic repository, each one in its own process so its peak memory
+# is measured on its own. RefactoringMiner is replaced by FakeMiner (one refactoring per commit).
+stage_names = ["mining (stub)", "diff extraction", "metrics", "plotting"]
+repo_name = "synthetic"
+
+
+def run_stage(stage_name, work_dir, repo_path, workers, results):
+    # part2 and part3 write to rminer-outputs/ in the working directory (and create it on import).
+    # Modules are imported before the clock starts, so only the stage itself is timed.
+    os.chdir(work_dir)
+    import part2
+    import part3
+    from profiler import start_profiling, stop_profiling, get_peak_rss_mb
+    from pipeline_cache import open_cache, load_refactoring_shas
+    from refactoring_miner import FakeMiner
+    from plot_engine import make_jobs, render_all, metrics_to_plot
+    from metrics_store import repo_partition_path
+
+    cache = open_cache()
+    profiler = start_profiling(repo_name, stage_name)
+    start = time.perf_counter()
+
+    if stage_name == "mining (stub)":
+        part2.miner = FakeMiner()
+        part2.mine_refactorings(repo_name, repo_path, cache)
+        commits = len(load_refactoring_shas(cache, repo_name))
+        files = 0
+    elif stage_name == "diff extraction":
+        part2.extract_commit_data(repo_name, repo_path, cache)
+        commits = cache.execute("SELECT COUNT(*) FROM commit_messages WHERE repo = ?", (repo_name,)).fetchone()[0]
+        files = cache.execute("SELECT COUNT(*) FROM diffs WHERE repo = ?", (repo_name,)).fetchone()[0]
+    elif stage_name == "metrics":
+        part3.compute_repository_metrics(repo_name, repo_path, cache)
+        with open(os.path.join("rminer-outputs", f"{repo_name}_metrics.json"), "r", encoding='utf-8') as file:
+            metrics = json.load(file)
+        commits = len({row["commit hash"] for row in metrics})
+        files = len(metrics)
+    else:
+        errors = render_all(make_jobs([(repo_name, repo_partition_path(repo_name), os.path.join("plots", repo_name))]),
+                            workers)
+        if errors:
+            raise RuntimeError(f"plotting failed: {errors}")
+        commits = 0
+        files = len(metrics_to_plot)  # images
+
+    seconds = time.perf_counter() - start
+    stop_profiling(os.path.join(work_dir, "profiles"))
+    peak_rss, child_peak_rss = get_peak_rss_mb()
+    results.put({
+        "seconds": seconds,
+        "commits": commits,
+        "files": files,
+        "commits/s": commits / seconds if seconds else 0,
+        "files/s": files / seconds if seconds else 0,
+        "peak rss mb": peak_rss,
+        "child peak rss mb": child_peak_rss,
+        "substages": {name: stats["wall seconds"] for name, stats in profiler.stages.items()}
+    })
+
+
+def run_benchmark(work_dir, commits, authors, files, methods, seed, workers):
+    repo_path = os.path.join(work_dir, repo_name)
+    start = time.perf_counter()
+    create_repository(repo_path, commits, authors, files, methods, seed=seed)
+    print(f"Created a repository with {commits} commits and {files} files in {time.perf_counter() - start:.1f}s")
+
+    results = multiprocessing.Queue()
+    stages = {}
+    for stage_name in stage_names:
+        process = multiprocessing.Process(target=run_stage, args=(stage_name, work_dir, repo_path, workers, results))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            raise RuntimeError(f"stage {stage_name} failed with exit code {process.exitcode}")
+        stages[stage_name] = results.get()
+    return stages
+
+
+def environment():
+    git_version = subprocess.run(["git", "--version"], capture_output=True, text=True).stdout.strip()
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "git": git_version}
+
+
+def format_results(runs):
+    lines = [f"{'commits':>7}  {'stage':<16} {'seconds':>8} {'commits/s':>10} {'files/s':>10} {'peak MB':>8}"]
+    for run in runs:
+        for stage_name, stats in run["stages"].items():
+            lines.append(f"{run['commits']:>7}  {stage_name:<16} {stats['seconds']:>8.2f} {stats['commits/s']:>10.1f} "
+                         f"{stats['files/s']:>10.1f} {stats['peak rss mb'] or 0:>8.0f}")
+    return "\n".join(lines)
+
+
+# Stages whose throughput dropped, or whose peak memory grew, by more than tolerance (a fraction)
+# compared with a baseline result file of the same parameters
+def find_regressions(results, baseline, tolerance):
+    if results["parameters"] != baseline["parameters"]:
+        print("Warning: the baseline was run with other parameters, results are not comparable")
+
+    baseline_runs = {run["commits"]: run for run in baseline["runs"]}
+    regressions = []
+    for run in results["runs"]:
+        baseline_run = baseline_runs.get(run["commits"])
+        if baseline_run is None:
+            continue
+        for stage_name, stats in run["stages"].items():
+            before = baseline_run["stages"].get(stage_name)
+            if before is None:
+                continue
+            measure = "commits/s" if before["commits/s"] else "files/s"
+            if before[measure] and stats[measure] < before[measure] * (1 - tolerance):
+                regressions.append(f"{stage_name} at {run['commits']} commits: {measure} "
+                                   f"{before[measure]:.1f} -> {stats[measure]:.1f}")
+            if before["peak rss mb"] and stats["peak rss mb"] > before["peak rss mb"] * (1 + tolerance):
+                regressions.append(f"{stage_name} at {run['commits']} commits: peak memory "
+                                   f"{before['peak rss mb']:.0f} MB -> {stats['peak rss mb']:.0f} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the mining, diff, metrics and plotting stages "
+                                                 "on synthetic Java repositories")
+    parser.add_argument("--commits", type=int, nargs="+", default=[100, 400],
+                        help="repository sizes to run, in commits (several sizes show how the stages scale)")
+    parser.add_argument("--authors", type=int, default=5, help="number of authors")
+    parser.add_argument("--files", type=int, default=50, help="number of .java files")
+    parser.add_argument("--methods", type=int, default=5, help="methods per class (file size)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the repository generator")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes of the plotting stage")
+    parser.add_argument("--output", default="bench_pipeline_results.json", help="file to save the results to")
+    parser.add_argument("--baseline", help="earlier results file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed throughput drop or memory growth before a stage counts as a regression")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic repositories and outputs")
+    args = parser.parse_args()
+
+    results = {
+        "parameters": {"authors": args.authors, "files": args.files, "methods": args.methods, "seed": args.seed,
+                       "workers": args.workers},
+        "environment": environment(),
+        "runs": []
+    }
+    for commits in args.commits:
+        work_dir = tempfile.mkdtemp(prefix=f"bench_pipeline_{commits}_")
+        try:
+            stages = run_benchmark(work_dir, commits, args.authors, args.files, args.methods, args.seed, args.workers)
+        finally:
+            if args.keep:
+                print(f"Outputs kept in {work_dir}")
+            else:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        results["runs"].append({"commits": commits, "stages": stages})
+
+    print(format_results(results["runs"]))
+    with open(args.output, "w", encoding='utf-8') as file:
+        json.dump(results, file, indent=4)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions compared with the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from plot_engine import metrics_to_plot, load_metrics_frame, make_jobs, render_all
+
+
+# Synthetic <repo>_metrics.json files with the layout written by part3
+def write_metrics_files(folder, repo_count, rows_per_repo, seed=0):
+    rng = random.Random(seed)
+    repositories = []
+    for r in range(repo_count):
+        repo_name = f"repo{r}"
+        rows = [dict({"commit hash": f"{rng.getrandbits(160):040x}", "file": f"File{i % 50}.java"},
+                     **{metric: rng.randint(0, 100) for metric in metrics_to_plot})
+                for i in range(rows_per_repo)]
+        metrics_file = os.path.join(folder, f"{repo_name}_metrics.json")
+        with open(metrics_file, "w", encoding='utf-8') as file:
+            json.dump(rows, file)
+        repositories.append((repo_name, metrics_file, os.path.join(folder, "plots", repo_name)))
+    return repositories
+
+
+# Previous approach of part4.py: a new pyplot figure per metric, all on one core
+def render_with_loop(repositories):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    for repo_name, metrics_file, output_dir in repositories:
+        os.makedirs(output_dir, exist_ok=True)
+        df = load_metrics_frame(metrics_file)
+        for metric in metrics_to_plot:
+            plt.figure(figsize=(10, 6))
+            sns.lineplot(data=df, x=df.index, y=metric, marker='o', label=metric)
+            plt.title(f"Evolution of {metric} for {repo_name}")
+            plt.xlabel('Commit Order')
+            plt.ylabel(f'{metric} Value')
+            plt.xticks(rotation=45)
+            plt.tight_layout()
+            plt.savefig(os.path.join(output_dir, f"{repo_name}_{metric}_evolution.png"))
+            plt.close()
+
+
+def timed(label, images, function, *args):
+    start = time.perf_counter()
+    function(*args)
+    seconds = time.perf_counter() - start
+    print(f"{label:<28} {seconds:8.2f}s {images / seconds:8.1f} images/s")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the serial plot loop with the parallel rendering engine")
+    parser.add_argument("--repos", type=int, default=8, help="number of synthetic repositories")
+    parser.add_argument("--rows", type=int, default=500, help="metrics rows per repository")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes of the engine")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    repositories = write_metrics_files(folder, args.repos, args.rows)
+    images = args.repos * len(metrics_to_plot)
+
+    baseline = timed("serial loop (new figures)", images, render_with_loop, repositories)
+    reused = timed("engine, 1 worker", images, render_all, make_jobs(repositories), 1)
+    parallel = timed(f"engine, {args.workers} workers", images, render_all, make_jobs(repositories), args.workers)
+    timed("engine, overview images", args.repos, render_all, make_jobs(repositories, overview=True), args.workers)
+
+    print(f"Speedup from reusing figures: {baseline / reused:.1f}x")
+    print(f"Speedup with {args.workers} workers:    {baseline / parallel:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
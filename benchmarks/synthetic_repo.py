@@ -0,0 +1,137 @@
+import os
+import random
+import argparse
+import subprocess
+
+# Fixed start date, time zone and identities, so the same parameters always give the same commit SHAs
+start_timestamp = 1577836800  # 2020-01-01 00:00:00 UTC
+commit_messages = ["Refactor {name}", "Fix bug in {name}", "Add feature to {name}", "Clean up {name}",
+                   "Update {name}", "Fix typo in {name}"]
+
+
+def class_name(index):
+    return f"Class{index}"
+
+
+def package_name(index, packages):
+    return f"org.example.pkg{index % packages}"
+
+
+def file_path(index, packages):
+    return "src/main/java/" + package_name(index, packages).replace(".", "/") + f"/{class_name(index)}.java"
+
+
+# Source of one class: fields, methods with branches and loops, imports and calls to other classes
+# (for CBO and RFC) and a superclass for some of them (for DIT and NOC). version changes the bodies.
+def java_source(index, packages, methods, version, file_count):
+    rng = random.Random(index * 7919 + version)
+    lines = [f"package {package_name(index, packages)};", ""]
+
+    # Superclass and collaborators are always classes with a lower index, so there are no cycles
+    parent = index - 1 - rng.randrange(min(index, 5)) if index and rng.random() < 0.4 else None
+    collaborators = sorted({rng.randrange(file_count) for _ in range(3)} - {index})
+    for other in collaborators + ([parent] if parent is not None else []):
+        if package_name(other, packages) != package_name(index, packages):
+            lines.append(f"import {package_name(other, packages)}.{class_name(other)};")
+    lines.append("")
+
+    extends = f" extends {class_name(parent)}" if parent is not None else ""
+    lines.append(f"public class {class_name(index)}{extends} {{")
+    lines.append(f"    private static final int LIMIT = {rng.randint(1, 100)};")
+    lines.append("    protected int counter;")
+    for other in collaborators:
+        lines.append(f"    private {class_name(other)} field{other};")
+    lines.append("")
+
+    for m in range(methods + version % 3):
+        lines.append(f"    public int method{m}(int value) {{")
+        lines.append(f"        int result = value * {rng.randint(1, 9)};")
+        for step in range(rng.randint(1, 4)):
+            kind = rng.choice(["if", "for", "while", "call"])
+            if kind == "if":
+                lines.append(f"        if (result > {rng.randint(0, 50)} && counter < LIMIT) {{")
+                lines.append(f"            result -= {step + version};")
+                lines.append("        } else {")
+                lines.append("            counter++;")
+                lines.append("        }")
+            elif kind == "for":
+                lines.append(f"        for (int i = 0; i < {rng.randint(2, 10)}; i++) {{")
+                lines.append("            result += i;")
+                lines.append("        }")
+            elif kind == "while":
+                lines.append("        while (result > LIMIT) {")
+                lines.append("            result /= 2;")
+                lines.append("        }")
+            elif collaborators:
+                other = rng.choice(collaborators)
+                lines.append(f"        if (field{other} != null) {{")
+                lines.append(f"            result += field{other}.method0(result);")
+                lines.append("        }")
+        lines.append("        return result;")
+        lines.append("    }")
+        lines.append("")
+
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def data_block(text):
+    encoded = text.encode("utf-8")
+    return f"data {len(encoded)}\n".encode("utf-8") + encoded + b"\n"
+
+
+# Create a git repository at repo_path with `commits` commits by `authors` authors. The first commit
+# adds `files` .java classes with about `methods` methods each, every later commit changes
+# 1 to max_files_per_commit of them. Everything is written through one `git fast-import` process.
+def create_repository(repo_path, commits=200, authors=5, files=50, methods=5, max_files_per_commit=4, packages=5,
+                      seed=0):
+    rng = random.Random(seed)
+    subprocess.run(["git", "init", "--quiet", "--initial-branch=master", repo_path], check=True)
+    versions = [0] * files
+    timestamp = start_timestamp
+
+    process = subprocess.Popen(["git", "-C", repo_path, "fast-import", "--quiet"], stdin=subprocess.PIPE)
+    for number in range(commits):
+        author = rng.randrange(authors)
+        timestamp += rng.randint(600, 2 * 24 * 3600)
+        if number == 0:
+            changed = list(range(files))
+            message = "Initial import"
+        else:
+            changed = rng.sample(range(files), rng.randint(1, min(max_files_per_commit, files)))
+            message = rng.choice(commit_messages).format(name=class_name(changed[0]))
+
+        signature = f"Developer {author} <dev{author}@example.com> {timestamp} +0000"
+        stream = [f"commit refs/heads/master\nmark :{number + 1}\nauthor {signature}\ncommitter {signature}\n"
+                  .encode("utf-8"), data_block(message)]
+        if number:
+            stream.append(f"from :{number}\n".encode("utf-8"))
+        for index in changed:
+            versions[index] += 1
+            stream.append(f"M 100644 inline {file_path(index, packages)}\n".encode("utf-8"))
+            stream.append(data_block(java_source(index, packages, methods, versions[index], files)))
+        stream.append(b"\n")
+        process.stdin.write(b"".join(stream))
+
+    process.stdin.close()
+    if process.wait() != 0:
+        raise RuntimeError(f"git fast-import failed for {repo_path}")
+    return repo_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create a synthetic Java git repository")
+    parser.add_argument("repo_path", help="folder of the new repository")
+    parser.add_argument("--commits", type=int, default=200, help="number of commits")
+    parser.add_argument("--authors", type=int, default=5, help="number of authors")
+    parser.add_argument("--files", type=int, default=50, help="number of .java files")
+    parser.add_argument("--methods", type=int, default=5, help="methods per class (file size)")
+    parser.add_argument("--files-per-commit", type=int, default=4, help="maximum files changed by a commit")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generator")
+    args = parser.parse_args()
+
+    if os.path.exists(args.repo_path):
+        raise SystemExit(f"{args.repo_path} already exists")
+    create_repository(args.repo_path, args.commits, args.authors, args.files, args.methods, args.files_per_commit,
+                      seed=args.seed)
+    print(f"Created {args.repo_path}")
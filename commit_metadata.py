@@ -0,0 +1,161 @@
+import subprocess
+import threading
+from datetime import datetime, timedelta, timezone
+
+
+# Reads commit objects (and blobs) through one long-lived `git cat-file --batch` process,
+# instead of spawning a `git log` and a `git rev-list` subprocess per commit.
+class CommitMetadataReader:
+    def __init__(self, repo_path):
+        self.repo_path = repo_path
+        self.process = subprocess.Popen(["git", "-C", repo_path, "cat-file", "--batch"], stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+        self.process.stdout.close()
+
+    # Metadata of a single commit, or None if the object is missing or not a commit
+    def read(self, commit_sha):
+        self.process.stdin.write(commit_sha.encode() + b"\n")
+        self.process.stdin.flush()
+        return self._read_commit()
+
+    # Content of a blob as text, or None if the object is missing or not a blob
+    def read_blob(self, blob_sha):
+        self.process.stdin.write(blob_sha.encode() + b"\n")
+        self.process.stdin.flush()
+        object_sha, object_type, content = self._read_object()
+        if object_type != "blob":
+            return None
+        return content.decode("utf-8", errors="replace")
+
+    # Metadata of many commits: the requests are written from a separate thread while the
+    # answers are read, so the pipe never blocks and git streams all objects in one pass.
+    def read_many(self, commit_shas):
+        commit_shas = list(commit_shas)
+
+        def write_requests():
+            for commit_sha in commit_shas:
+                self.process.stdin.write(commit_sha.encode() + b"\n")
+            self.process.stdin.flush()
+
+        writer = threading.Thread(target=write_requests)
+        writer.start()
+        metadata = {commit_sha: self._read_commit() for commit_sha in commit_shas}
+        writer.join()
+        return metadata
+
+    def _read_commit(self):
+        object_sha, object_type, content = self._read_object()
+        if object_type != "commit":
+            return None
+        return parse_commit_object(object_sha, content)
+
+    # Read the next answer of git cat-file as (sha, type, content); type is None for missing objects
+    def _read_object(self):
+        header = self.process.stdout.readline().decode().split()
+        if len(header) != 3:  # "<sha> missing" or "<sha> ambiguous"
+            return None, None, None
+
+        object_sha, object_type, size = header
+        content = self.process.stdout.read(int(size))
+        self.process.stdout.read(1)  # Newline after the object content
+        return object_sha, object_type, content
+
+
+# Convert "<name> <<email>> <timestamp> <+hhmm>" into name, email and an aware datetime
+def parse_signature(signature):
+    name_email, timestamp, offset = signature.rsplit(" ", 2)
+    name, email = name_email.rsplit(" <", 1)
+    sign = -1 if offset.startswith("-") else 1
+    tz = timezone(sign * timedelta(hours=int(offset[1:3]), minutes=int(offset[3:5])))
+    return name, email.rstrip(">"), datetime.fromtimestamp(int(timestamp), tz)
+
+
+def parse_commit_object(commit_sha, content):
+    header, _, message = content.partition(b"\n\n")
+    metadata = {
+        "commit hash": commit_sha,
+        "parents": [],
+        "message": "",
+        "author": None,
+        "author email": None,
+        "author date": None,
+        "committer": None,
+        "committer email": None,
+        "committer date": None
+    }
+
+    encoding = "utf-8"
+    for line in header.decode("utf-8", errors="replace").splitlines():
+        key, _, value = line.partition(" ")
+        if key == "parent":
+            metadata["parents"].append(value)
+        elif key in ("author", "committer"):
+            metadata[key], metadata[f"{key} email"], metadata[f"{key} date"] = parse_signature(value)
+        elif key == "encoding":
+            encoding = value
+
+    try:
+        metadata["message"] = message.decode(encoding, errors="replace").strip()
+    except LookupError:  # Unknown encoding name in the commit header
+        metadata["message"] = message.decode("utf-8", errors="replace").strip()
+    return metadata
+
+
+# Metadata (message, parents, author, committer and dates) of all given commits in one pass
+def read_commit_metadata(repo_path, commit_shas):
+    with CommitMetadataReader(repo_path) as reader:
+        return reader.read_many(commit_shas)
+
+
+# Blob ids of the files changed by each commit against its first parent (an empty tree for the first
+# commit), from one `git diff-tree --stdin` process. Returns {commit sha: {(old path, new path):
+# (blob before, blob after)}}; the path and blob of the missing side of an added or deleted file are
+# None. Renames are detected like GitPython does (-M), so the paths match those PyDriller reports.
+# Merge commits are left out, PyDriller lists no changed files for them either.
+def read_blob_ids(repo_path, commit_shas):
+    result = subprocess.run(["git", "-C", repo_path, "diff-tree", "--stdin", "-r", "-M", "--root", "--raw", "-z",
+                             "--full-index", "--no-abbrev"], input="\n".join(commit_shas).encode() + b"\n",
+                            capture_output=True)
+    if result.returncode != 0:
+        print(f"Error reading the blob ids of {repo_path}: {result.stderr.decode(errors='replace').strip()}")
+
+    blob_ids = {}
+    changes = None
+    fields = result.stdout.split(b"\0")
+    index = 0
+    while index < len(fields):
+        field = fields[index].decode("utf-8", errors="surrogateescape")
+        index += 1
+        if not field.startswith(":"):
+            if field.strip():
+                changes = blob_ids.setdefault(field.strip(), {})
+            continue
+
+        # ":<mode before> <mode after> <blob before> <blob after> <status>", then one path, two for renames and copies
+        _, _, before, after, status = field[1:].split(" ")
+        old_path = fields[index].decode("utf-8", errors="surrogateescape")
+        index += 1
+        if status[0] in "RC":
+            new_path = fields[index].decode("utf-8", errors="surrogateescape")
+            index += 1
+        else:
+            new_path = old_path
+
+        if status[0] == "A":
+            old_path, before = None, None
+        elif status[0] == "D":
+            new_path, after = None, None
+        if changes is not None:
+            changes[(old_path, new_path)] = (before, after)
+    return blob_ids
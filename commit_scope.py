@@ -0,0 +1,119 @@
+import random
+import subprocess
+from commit_metadata import read_commit_metadata
+
+# Commits of each repository that the mining, diff and metrics stages work on.
+# The default covers the whole history; fields left at None are not used.
+scope = {
+    "since": None,  # Only commits made on or after this date, e.g. "2020-01-01"
+    "until": None,  # Only commits made before this date
+    "from sha": None,  # Only commits after this commit (excluded, like git from..to)
+    "to sha": None,  # Only commits up to this commit (included) instead of HEAD
+    "max commits": None,  # Only the most recent commits of the window
+    "sample size": None,  # Stratified random sample of this many refactoring commits
+    "sample strata": 10,  # Number of equal time periods the sample is spread over
+    "sample seed": 0  # Seed of the sample, so every run selects the same commits
+}
+
+window_fields = ("since", "until", "from sha", "to sha", "max commits")
+
+
+def has_window(scope=scope):
+    return any(scope.get(field) for field in window_fields)
+
+
+# Commits of the window, oldest first, or None when the scope covers the whole history
+def window_commits(repo_path, scope=scope):
+    if not has_window(scope):
+        return None
+
+    command = ["git", "-C", repo_path, "rev-list", "--reverse", "--topo-order"]
+    if scope.get("since"):
+        command.append(f"--since={scope['since']}")
+    if scope.get("until"):
+        command.append(f"--until={scope['until']}")
+    if scope.get("max commits"):
+        # Applied before --reverse, so these are the most recent commits
+        command.append(f"--max-count={scope['max commits']}")
+    command.append(scope.get("to sha") or "HEAD")
+    if scope.get("from sha"):
+        command.append(f"^{scope['from sha']}")
+
+    result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8')
+    if result.returncode != 0:
+        raise RuntimeError(f"cannot list the commits of the window in {repo_path}: {result.stderr}")
+    return result.stdout.split()
+
+
+# Commits of the window (oldest first) that have no child in the window, the last commit first.
+# Every commit of the window is an ancestor of one of them.
+def window_tips(repo_path, commits):
+    metadata = read_commit_metadata(repo_path, commits)
+    parents = {parent for commit_sha in commits for parent in metadata.get(commit_sha, {}).get("parents", [])}
+    return [commit_sha for commit_sha in reversed(commits) if commit_sha not in parents]
+
+
+# Commit ranges [(start, end), ...] that together cover all commits of the window, like git start..end.
+# A window selected by date can have several tips (window commits without a child in the window), e.g.
+# a side branch merged after `until`, so there is one range per tip. The range of the newest tip starts
+# before the oldest window commit (start is None when the window reaches the first commit), the other
+# tips start where they branched off its history (None for an unrelated history). Ranges can also hold commits outside the window.
+def window_ranges(repo_path, commits):
+    end, *tips = window_tips(repo_path, commits)
+
+    result = subprocess.run(["git", "-C", repo_path, "rev-parse", "--verify", "--quiet", f"{commits[0]}^"],
+                            capture_output=True, text=True, encoding='utf-8')
+    ranges = [(result.stdout.strip() if result.returncode == 0 else None, end)]
+
+    for tip in tips:
+        result = subprocess.run(["git", "-C", repo_path, "merge-base", tip, end], capture_output=True, text=True,
+                                encoding='utf-8')
+        branch_point = result.stdout.strip() or None
+        if branch_point == tip:
+            # Reachable from end through commits outside the window, already in the first range
+            continue
+        ranges.append((branch_point, tip))
+    return ranges
+
+
+# Sample size commits spread over equal time periods between the first and the last commit,
+# each period contributing in proportion to its number of commits. The order of commit_shas is kept.
+def stratified_sample(repo_path, commit_shas, sample_size, strata=10, seed=0):
+    metadata = read_commit_metadata(repo_path, commit_shas)
+    timestamps = {commit_sha: metadata[commit_sha]["committer date"].timestamp() if metadata.get(commit_sha) else 0
+                  for commit_sha in commit_shas}
+    first, last = min(timestamps.values()), max(timestamps.values())
+    width = (last - first) / strata or 1
+
+    groups = [[] for _ in range(strata)]
+    for commit_sha in sorted(commit_shas):
+        groups[min(strata - 1, int((timestamps[commit_sha] - first) / width))].append(commit_sha)
+
+    # Proportional allocation, the remaining commits go to the periods with the largest remainders
+    shares = [len(group) * sample_size / len(commit_shas) for group in groups]
+    allocation = [int(share) for share in shares]
+    by_remainder = sorted(range(strata), key=lambda i: shares[i] - allocation[i], reverse=True)
+    for i in by_remainder[:sample_size - sum(allocation)]:
+        allocation[i] += 1
+
+    rng = random.Random(seed)
+    sampled = set()
+    for group, count in zip(groups, allocation):
+        sampled.update(rng.sample(group, count))
+    return [commit_sha for commit_sha in commit_shas if commit_sha in sampled]
+
+
+# Refactoring commits selected by the scope: those inside the window, then the sample
+def select_commits(repo_path, commit_shas, scope=scope):
+    selected = list(commit_shas)
+
+    window = window_commits(repo_path, scope)
+    if window is not None:
+        window = set(window)
+        selected = [commit_sha for commit_sha in selected if commit_sha in window]
+
+    sample_size = scope.get("sample size")
+    if sample_size and len(selected) > sample_size:
+        selected = stratified_sample(repo_path, selected, sample_size, scope.get("sample strata") or 1,
+                                     scope.get("sample seed") or 0)
+    return selected
@@ -0,0 +1,194 @@
+import io
+import gzip
+import json
+import hashlib
+from collections import OrderedDict
+
+# Key used when one side of a change has no blob (file added or deleted)
+null_blob = "0" * 40
+
+# Characters of diff bodies read_diffs keeps in memory; bodies pushed out are read again from the file
+body_cache_size = 64 * 1024 * 1024
+
+
+# SHA-1 of a file content in the form of a git blob id. It is the id git gives the file only when the
+# content is the exact text of the file: PyDriller decodes files as UTF-8 and drops invalid bytes.
+def git_blob_sha(content):
+    data = content.encode("utf-8", errors="surrogateescape")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+# Key identifying a diff body by the blob pair it was computed from, with the blob ids read from git
+# (commit_metadata.read_blob_ids). Two file changes with the same blobs before and after have the same
+# diff, so the body is stored once.
+def diff_key(blob_ids, diff_content):
+    if blob_ids is None:
+        # Change git did not report: fall back to the diff content itself
+        return "diff-" + hashlib.sha1((diff_content or "").encode("utf-8", errors="surrogateescape")).hexdigest()
+
+    before, after = blob_ids
+    return f"{before or null_blob}..{after or null_blob}"
+
+
+# Open a JSON Lines file in text mode, compressed according to its extension (.gz or .zst)
+def open_jsonl(path, mode="r"):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("the zstandard package is needed to read or write .zst files")
+
+        if mode == "w":
+            raw = zstandard.ZstdCompressor().stream_writer(open(path, "wb"), closefd=True)
+        else:
+            raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return io.TextIOWrapper(raw, encoding="utf-8")
+
+    return open(path, mode, encoding="utf-8")
+
+
+# Open a JSON Lines file for reading in binary mode, so the reader can count the byte offset of every line
+def open_jsonl_binary(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("the zstandard package is needed to read or write .zst files")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+
+    return open(path, "rb")
+
+
+# File name of the diff output for the configured compression (None, "gzip" or "zstd")
+def diff_output_path(base_path, compression=None):
+    extensions = {None: "", "gzip": ".gz", "zstd": ".zst"}
+    return base_path + ".jsonl" + extensions[compression]
+
+
+# Writes one JSON Lines record per commit file as it is produced. A diff body is written
+# once, before the first file record that refers to it, and later records only carry its key.
+class DiffWriter:
+    def __init__(self, path):
+        self.file = open_jsonl(path, "w")
+        self.written_keys = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def write(self, diff_data):
+        key = diff_data["diff key"]
+        if key not in self.written_keys:
+            self.written_keys.add(key)
+            self._write_line({"type": "body", "diff key": key, "diff content": diff_data.get("diff content")})
+
+        self._write_line({
+            "type": "file",
+            "commit hash": diff_data["commit hash"],
+            "previous commit hash": diff_data["previous commit hash"],
+            "diff stats": diff_data["diff stats"],
+            "diff key": key
+        })
+
+    def _write_line(self, record):
+        self.file.write(json.dumps(record) + "\n")
+
+
+# Reads diff body records back by their byte offset in the (uncompressed) diff output. Plain files
+# seek to the record; compressed streams cannot seek, so they are read forward from the current
+# position, or from the start of the file when the record lies behind it.
+class BodyReader:
+    def __init__(self, path):
+        self.path = path
+        self.compressed = path.endswith((".gz", ".zst"))
+        self.file = None
+        self.position = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def read(self, offset):
+        if self.file is None or (self.compressed and offset < self.position):
+            self.close()
+            self.file = open_jsonl_binary(self.path)
+            self.position = 0
+
+        if self.compressed:
+            while self.position < offset:
+                skipped = len(self.file.read(min(1 << 20, offset - self.position)))
+                if not skipped:
+                    raise ValueError(f"{self.path} ends before offset {offset}")
+                self.position += skipped
+        else:
+            self.file.seek(offset)
+
+        line = self.file.readline()
+        self.position = offset + len(line)
+        return json.loads(line)["diff content"]
+
+
+# Iterate the file records of a diff output without loading the whole file.
+# With with_content, "diff content" is filled in from the body records: the most recent bodies are
+# kept in memory (up to body_cache_size characters) and older ones are read again by their offset.
+# Without it only the records and their "diff key" are yielded and bodies are skipped.
+def read_diffs(path, with_content=True, cache_size=body_cache_size):
+    offsets = {}
+    bodies = OrderedDict()
+    cached_size = 0
+
+    with open_jsonl_binary(path) as file, BodyReader(path) as body_reader:
+        offset = 0
+        for line in file:
+            line_offset = offset
+            offset += len(line)
+            record = json.loads(line)
+
+            if record["type"] == "body":
+                if with_content:
+                    key, content = record["diff key"], record["diff content"]
+                    offsets[key] = line_offset
+                    bodies[key] = content
+                    cached_size += len(content or "")
+                    while cached_size > cache_size and len(bodies) > 1:
+                        cached_size -= len(bodies.popitem(last=False)[1] or "")
+                continue
+
+            del record["type"]
+            if with_content:
+                key = record["diff key"]
+                if key in bodies:
+                    bodies.move_to_end(key)
+                    record["diff content"] = bodies[key]
+                elif key in offsets:
+                    record["diff content"] = body_reader.read(offsets[key])
+                else:
+                    record["diff content"] = None
+            yield record
+
+
+# Iterate the unique diff bodies of a diff output as (key, content) pairs
+def read_diff_bodies(path):
+    with open_jsonl(path, "r") as file:
+        for line in file:
+            record = json.loads(line)
+            if record["type"] == "body":
+                yield record["diff key"], record["diff content"]
@@ -0,0 +1,190 @@
+import numpy as np
+import pandas as pd
+from pydriller import RepositoryMining
+
+
+# Build a per-repository history index with a single pass over the commit log.
+# The index maps each file path to the list of commits that touched it, keeps the
+# author/date of every commit and holds project-wide totals, so the process metrics
+# can be answered without walking the whole history again for every file.
+def build_history_index(repo_path, history_index=None, only_commits=None):
+    if history_index is None:
+        history_index = new_history_index()
+
+    # Only walk the given commits when extending an index loaded from the cache
+    if only_commits is not None:
+        if not only_commits:
+            return history_index
+        commits = RepositoryMining(repo_path, only_commits=only_commits).traverse_commits()
+    else:
+        commits = RepositoryMining(repo_path).traverse_commits()
+
+    for commit in commits:
+        add_commit_to_index(history_index, commit)
+
+    return history_index
+
+
+def new_history_index():
+    return {
+        "files": {},  # file path -> list of commit entries touching that file
+        "commits": {},  # commit hash -> author, date, position and cumulative project additions
+        "total_additions": 0,
+        "total_deletions": 0,
+        "total_commits": 0
+    }
+
+
+# Record one PyDriller commit in the index (also used to extend an existing index)
+def add_commit_to_index(history_index, commit):
+    file_changes = [(modified_file.new_path or modified_file.old_path, modified_file.added, modified_file.removed)
+                    for modified_file in commit.modifications]
+    add_commit_entry(history_index, commit.hash, commit.author.name, commit.committer_date, file_changes)
+
+
+# Record a commit given as plain values, e.g. when loading the index back from the cache
+def add_commit_entry(history_index, commit_sha, author, date, file_changes):
+    if commit_sha in history_index["commits"]:
+        return
+
+    position = history_index["total_commits"]
+    history_index["total_commits"] += 1
+
+    for file_path, added, removed in file_changes:
+        history_index["files"].setdefault(file_path, []).append({
+            "commit hash": commit_sha,
+            "position": position,
+            "author": author,
+            "date": date,
+            "added": added,
+            "removed": removed
+        })
+        history_index["total_additions"] += added
+        history_index["total_deletions"] += removed
+
+    history_index["commits"][commit_sha] = {
+        "author": author,
+        "date": date,
+        "position": position,
+        "total_additions": history_index["total_additions"]
+    }
+
+
+# Process metrics of a file that has no history in the index
+empty_process_metrics = {"NDEV": 0, "AGE": 0, "NUC": 0, "CEXP": 0, "REXP": 0, "OEXP": 0, "EXP": 0}
+
+seconds_per_day = 24 * 60 * 60
+recent_experience_seconds = 30 * seconds_per_day
+
+
+# One row per (commit, file) change of the history index, ordered by file and commit position
+def history_frame(history_index):
+    rows = [(file_path, c["commit hash"], c["position"], c["author"], c["date"].timestamp(), c["added"])
+            for file_path, file_commits in history_index["files"].items() for c in file_commits]
+    df = pd.DataFrame(rows, columns=["file", "commit hash", "position", "author", "timestamp", "added"])
+    return df.sort_values(["file", "position"], kind="stable", ignore_index=True)
+
+
+# Recent experience of every change of the change table: changes of the same author to the same file,
+# up to and including this one, made in the month before it. Each (file, author) group is taken in
+# position order; where its dates never go back, the changes outside the month are found with a
+# binary search over the dates of all groups laid end to end, so the cost stays linear in the
+# number of changes. Groups with commits dated out of order are counted change by change.
+def recent_experience(df, group_ids):
+    order = np.lexsort((df["position"].to_numpy(), group_ids))
+    groups = group_ids[order]
+    timestamps = np.rint(df["timestamp"].to_numpy()[order]).astype("int64")
+    same_group = groups[1:] == groups[:-1]
+
+    group_starts = np.flatnonzero(np.r_[True, ~same_group])
+    group_start = group_starts[np.cumsum(np.r_[True, ~same_group]) - 1]
+    changes_so_far = np.arange(len(order)) - group_start + 1
+
+    # Dates of group g shifted into their own interval [g * span, (g + 1) * span), sorted overall
+    first = timestamps.min() - recent_experience_seconds
+    span = timestamps.max() - first + 1
+    keys = groups * span + (timestamps - first)
+    thresholds = groups * span + (timestamps - recent_experience_seconds - first)
+    recent = changes_so_far - (np.searchsorted(keys, thresholds, side="right") - group_start)
+
+    out_of_order = np.unique(groups[1:][same_group & (timestamps[1:] < timestamps[:-1])])
+    for start, end in zip(np.searchsorted(groups, out_of_order, side="left"),
+                          np.searchsorted(groups, out_of_order, side="right")):
+        group_timestamps = timestamps[start:end]
+        for i in range(end - start):
+            recent[start + i] = np.count_nonzero(
+                group_timestamps[:i + 1] > group_timestamps[i] - recent_experience_seconds)
+
+    result = np.empty(len(order), dtype="int64")
+    result[order] = recent
+    return result
+
+
+# Process metrics of many files in many commits, computed in bulk with group-wise cumulative
+# operations over the change table instead of a Python loop over the history of every file.
+# Only the history up to and including each commit is considered, so the results do not change
+# when newer commits are added to the repository. Returns {(commit hash, file path): metrics}
+# for every file changed by the given commits (all commits when commit_shas is None).
+def compute_process_metrics(history_index, commit_shas=None, file_paths=None):
+    df = history_frame(history_index)
+
+    # Metrics of a file only depend on its own changes, so drop the files no target commit touched
+    if commit_shas is not None:
+        df = df[df["file"].isin(df.loc[df["commit hash"].isin(commit_shas), "file"].unique())]
+    if file_paths is not None:
+        df = df[df["file"].isin(file_paths)]
+    if df.empty:
+        return {}
+    df = df.reset_index(drop=True)
+
+    by_file = df.groupby("file", sort=False)
+    by_author = df.groupby(["file", "author"], sort=False)
+
+    # Running counts: changes of the file (NUC), changes of the author to the file (CEXP)
+    # and number of distinct authors of the file so far (NDEV)
+    df["NUC"] = by_file.cumcount() + 1
+    df["CEXP"] = by_author.cumcount() + 1
+    df["NDEV"] = (df["CEXP"] == 1).astype("int64").groupby(df["file"]).cumsum()
+
+    # Additions of the highest contributor so far: per author additions only grow, so it is the
+    # running maximum of the per author running sums
+    df["top additions"] = by_author["added"].cumsum().groupby(df["file"]).cummax()
+
+    # Geometric mean of the changes per author in log space: when an author's change count goes
+    # from k - 1 to k, the sum of the logs grows by log(k) - log(k - 1)
+    log_step = np.log(df["CEXP"]) - np.log(np.maximum(df["CEXP"] - 1, 1))
+    df["EXP"] = np.exp(log_step.groupby(df["file"]).cumsum() / df["NDEV"])
+
+    df["timestamp sum"] = by_file["timestamp"].cumsum()
+
+    # A commit can change the same path more than once, its metrics are those of its last row
+    df["changes in commit"] = df.groupby(["file", "position"], sort=False)["position"].transform("size")
+    targets = df[~df.duplicated(["file", "position"], keep="last")]
+    if commit_shas is not None:
+        targets = targets[targets["commit hash"].isin(commit_shas)]
+    targets = targets.copy()
+
+    # Average age (in days) of the earlier changes of the file
+    earlier_changes = targets["NUC"] - targets["changes in commit"]
+    earlier_timestamps = targets["timestamp sum"] - targets["changes in commit"] * targets["timestamp"]
+    age = (earlier_changes * targets["timestamp"] - earlier_timestamps) / earlier_changes.clip(lower=1)
+    targets["AGE"] = np.where(earlier_changes > 0, age / seconds_per_day, 0.0)
+
+    # Ownership: share of the project additions (up to the commit) made by the highest contributor
+    total_additions = targets["commit hash"].map(
+        {commit_sha: commit["total_additions"] for commit_sha, commit in history_index["commits"].items()})
+    targets["OEXP"] = np.where(total_additions > 0, targets["top additions"] / total_additions.where(
+        total_additions > 0, 1) * 100, 0.0)
+
+    # Recent experience: changes of the author to the file in the month before the commit
+    targets["REXP"] = recent_experience(df, by_author.ngroup().to_numpy())[targets.index]
+
+    columns = list(empty_process_metrics)
+    return {(commit_sha, file_path): dict(zip(columns, values)) for commit_sha, file_path, *values in
+            targets[["commit hash", "file"] + columns].itertuples(index=False, name=None)}
+
+
+# Process metrics of one file in one commit (use compute_process_metrics for many at once)
+def calculate_process_metrics(history_index, file_path, commit_sha):
+    process_metrics = compute_process_metrics(history_index, [commit_sha], [file_path])
+    return process_metrics.get((commit_sha, file_path), dict(empty_process_metrics))
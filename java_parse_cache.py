@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import sqlite3
+from collections import OrderedDict
+import javalang.tree
+from javalang.parse import parse as javalang_parse
+from diff_store import git_blob_sha
+from profiler import stage, add_counts
+
+# Persistent cache of javalang parse results, keyed by git blob SHA
+output_dir = "rminer-outputs"
+cache_file = os.path.join(output_dir, "java_parse_cache.sqlite")
+max_cache_size_mb = 512
+memory_cache_items = 2048
+pending_last_used_limit = 1000  # Disk hits whose last_used time is written in one transaction
+
+# Bump when analyze_java_source changes, so results of older versions are computed again
+analysis_version = 2
+
+# Nodes that add a branch to the control flow of a method (for the cyclomatic complexity)
+decision_nodes = (javalang.tree.IfStatement, javalang.tree.WhileStatement, javalang.tree.DoStatement,
+                  javalang.tree.ForStatement, javalang.tree.SwitchStatementCase, javalang.tree.CatchClause,
+                  javalang.tree.TernaryExpression)
+
+empty_class_metrics = {"NOM": 0, "NOPM": 0, "NOF": 0, "NOSF": 0, "NOPF": 0, "WMC": 0, "RFC": 0, "ELOC": 0}
+
+
+def cyclomatic_complexity(method):
+    decisions = sum(1 for _, node in method if isinstance(node, decision_nodes))
+    conditions = sum(1 for _, node in method.filter(javalang.tree.BinaryOperation) if node.operator in ("&&", "||"))
+    return 1 + decisions + conditions
+
+
+# Dotted name of a javalang ReferenceType (java.util.List is nested as java -> util -> List)
+def reference_name(reference):
+    names = []
+    while reference is not None:
+        names.append(reference.name)
+        reference = getattr(reference, "sub_type", None)
+    return ".".join(names)
+
+
+# Declared type with its supertypes and the types it refers to, as used by the type index
+def describe_type(node):
+    if isinstance(node, javalang.tree.ClassDeclaration):
+        superclass = reference_name(node.extends) if node.extends else None
+        interfaces = [reference_name(i) for i in node.implements or []]
+    elif isinstance(node, javalang.tree.InterfaceDeclaration):
+        superclass = None
+        interfaces = [reference_name(i) for i in node.extends or []]
+    else:
+        superclass = None
+        interfaces = [reference_name(i) for i in getattr(node, "implements", None) or []]
+
+    # Skip the inner parts of qualified names, they are included in the name of their outer node
+    reference_nodes = [ref for _, ref in node.filter(javalang.tree.ReferenceType)]
+    inner_parts = {id(ref.sub_type) for ref in reference_nodes if ref.sub_type is not None}
+    references = {reference_name(ref) for ref in reference_nodes if id(ref) not in inner_parts}
+    references.discard(node.name)
+    return {
+        "name": node.name,
+        "superclass": superclass,
+        "interfaces": interfaces,
+        "references": sorted(references)
+    }
+
+
+# Parse a Java file and derive the class-level metrics and the declared types from it.
+# The result only contains plain values, so it can be stored in the cache.
+def analyze_java_source(source_code):
+    tree = javalang_parse(source_code)
+    class_metrics = dict(empty_class_metrics)
+    measured_class = None
+    types = []
+
+    for path, node in tree:
+        if isinstance(node, javalang.tree.TypeDeclaration):
+            types.append(describe_type(node))
+
+    # Process class and method details (the last class declaration of the file is measured)
+    for path, node in tree:
+        if isinstance(node, javalang.tree.ClassDeclaration):
+            measured_class = node.name
+            class_metrics["NOM"] = len(node.methods)  # Number of methods
+            class_metrics["NOPM"] = len([m for m in node.methods if 'public' in m.modifiers])
+            class_metrics["NOF"] = len(node.fields)
+            class_metrics["NOSF"] = len([f for f in node.fields if 'static' in f.modifiers])
+            class_metrics["NOPF"] = len([f for f in node.fields if 'public' in f.modifiers])
+
+            # Weighted Methods per Class (WMC): sum of the cyclomatic complexity of the methods
+            class_metrics["WMC"] = sum(cyclomatic_complexity(m) for m in node.methods if m.body)
+
+            # ELOC (Effective Lines of Code)
+            class_metrics["ELOC"] = len([line for line in source_code.splitlines() if line.strip()])
+
+            # RFC - Response for a Class: methods of the class + distinct methods they call
+            called_methods = {call.member for m in node.methods
+                              for _, call in m.filter(javalang.tree.MethodInvocation)}
+            class_metrics["RFC"] = class_metrics["NOM"] + len(called_methods)
+
+    return {
+        "version": analysis_version,
+        "class metrics": class_metrics,
+        "measured class": measured_class,
+        "package": tree.package.name if tree.package else None,
+        "imports": [{"path": i.path, "wildcard": i.wildcard} for i in tree.imports if not i.static],
+        "types": types
+    }
+
+
+# Content-addressed cache of analyze_java_source results. Recently used entries are kept in
+# memory; all entries are persisted in SQLite and the least recently used ones are evicted
+# when the database grows over its size limit.
+class ParseCache:
+    def __init__(self, path=cache_file, max_size_mb=max_cache_size_mb, memory_items=memory_cache_items):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS parses (blob_sha TEXT PRIMARY KEY, data TEXT NOT NULL, "
+                          "size INTEGER NOT NULL, last_used REAL NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS parses_last_used ON parses (last_used)")
+        self.max_size = max_size_mb * 1024 * 1024
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM parses").fetchone()[0]
+        self.memory = OrderedDict()
+        self.memory_items = memory_items
+        # last_used times of the disk hits not written yet, saved together with the next write
+        self.pending_last_used = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self.conn:
+            self._write_last_used()
+        self.conn.close()
+
+    def get(self, blob_sha):
+        if blob_sha in self.memory:
+            self.memory.move_to_end(blob_sha)
+            return self.memory[blob_sha]
+
+        row = self.conn.execute("SELECT data FROM parses WHERE blob_sha = ?", (blob_sha,)).fetchone()
+        if row is None:
+            return None
+        value = json.loads(row[0])
+        if value.get("version") != analysis_version:
+            return None
+
+        self.pending_last_used[blob_sha] = time.time()
+        if len(self.pending_last_used) >= pending_last_used_limit:
+            with self.conn:
+                self._write_last_used()
+        self._remember(blob_sha, value)
+        return value
+
+    def put(self, blob_sha, value):
+        data = json.dumps(value)
+        with self.conn:
+            self._write_last_used()
+            old_size = self.conn.execute("SELECT size FROM parses WHERE blob_sha = ?", (blob_sha,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO parses (blob_sha, data, size, last_used) VALUES (?, ?, ?, ?)",
+                              (blob_sha, data, len(data), time.time()))
+        self.size += len(data) - (old_size[0] if old_size else 0)
+        self._remember(blob_sha, value)
+
+        if self.size > self.max_size:
+            self.evict()
+
+    # Delete the least recently used entries until the cache is at 90% of its size limit
+    def evict(self):
+        target_size = self.max_size * 0.9
+        with self.conn:
+            self._write_last_used()
+        evicted = []
+        for blob_sha, size in self.conn.execute("SELECT blob_sha, size FROM parses ORDER BY last_used").fetchall():
+            if self.size <= target_size:
+                break
+            evicted.append((blob_sha,))
+            self.size -= size
+            self.memory.pop(blob_sha, None)
+
+        with self.conn:
+            self.conn.executemany("DELETE FROM parses WHERE blob_sha = ?", evicted)
+
+    # Analysis of a Java source, parsed only if its blob was never seen before.
+    # Parse errors are cached as well, so broken files are not parsed again either.
+    def analyze(self, source_code):
+        return self.analyze_blob(git_blob_sha(source_code), lambda: source_code)
+
+    # Same as analyze, for a blob whose SHA is already known; load_source is only called on a miss
+    def analyze_blob(self, blob_sha, load_source):
+        value = self.get(blob_sha)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        source_code = load_source()
+        if source_code is None:  # Blob not available (not cached, so it is tried again next time)
+            return {"version": analysis_version, "error": f"blob {blob_sha} not found"}
+        try:
+            with stage("javalang parse"):
+                value = analyze_java_source(source_code)
+            add_counts("javalang parse", files=1)
+        except (javalang.parser.JavaParserBaseException, javalang.tokenizer.LexerError) as e:
+            value = {"version": analysis_version, "error": f"{type(e).__name__}: {e}"}
+        self.put(blob_sha, value)
+        return value
+
+    def _write_last_used(self):
+        if self.pending_last_used:
+            self.conn.executemany("UPDATE parses SET last_used = ? WHERE blob_sha = ?",
+                                  [(used, blob_sha) for blob_sha, used in self.pending_last_used.items()])
+            self.pending_last_used = {}
+
+    def _remember(self, blob_sha, value):
+        self.memory[blob_sha] = value
+        self.memory.move_to_end(blob_sha)
+        if len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
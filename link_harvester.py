@@ -0,0 +1,230 @@
+import os
+import re
+import json
+import asyncio
+import urllib.request
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urldefrag, urlsplit
+
+# Hosts whose repository URLs are harvested, in the form https://<host>/<owner>/<repo>
+repo_hosts = ("github.com", "gitlab.com", "bitbucket.org")
+
+# Time limits (seconds) of one page download and of one `git ls-remote`
+fetch_timeout = 30
+ls_remote_timeout = 60
+
+# First path segments that are pages of the host rather than repository owners
+# (https://github.com/orgs/<name>, https://github.com/features/actions, https://gitlab.com/explore/projects...)
+reserved_owners = {
+    "github.com": {"about", "apps", "collections", "customer-stories", "enterprise", "events", "explore", "features",
+                   "issues", "login", "marketplace", "new", "notifications", "organizations", "orgs", "pricing",
+                   "pulls", "search", "security", "settings", "site", "sponsors", "topics", "trending", "users"},
+    "gitlab.com": {"-", "dashboard", "explore", "groups", "help", "search", "users"},
+    "bitbucket.org": {"account", "dashboard", "product", "repo", "site", "snippets"}
+}
+
+repo_url_pattern = re.compile(
+    r"(?:(?:https?|git|ssh)://(?:[^@/\s]+@)?|git@)(?:www\.)?(" + "|".join(re.escape(h) for h in repo_hosts)
+    + r")[/:]([A-Za-z0-9_.-]+)/([A-Za-z0-9_.-]+)", re.IGNORECASE)
+
+
+# Canonical form of a repository URL (https://<host>/<owner>/<repo>.git), or None if it is not one.
+# SSH and git:// URLs, "www.", trailing slashes, ".git" and sub pages (/tree/..., /issues) are handled.
+def normalize_repo_url(url):
+    match = repo_url_pattern.match(url.strip())
+    if not match:
+        return None
+    host, owner, repo = match.groups()
+    host = host.lower()
+    while repo.lower().endswith(".git"):
+        repo = repo[:-4]
+    if owner.lower() in reserved_owners[host] or owner in (".", "..") or repo in ("", ".", ".."):
+        return None
+    return f"https://{host}/{owner}/{repo}.git"
+
+
+# Remove duplicates, keeping the first spelling seen. Hosts treat owner and repository names
+# case-insensitively, so URLs differing only in case are the same repository.
+def dedupe_repo_urls(urls):
+    seen = set()
+    unique = []
+    for url in urls:
+        normalized = normalize_repo_url(url)
+        if normalized and normalized.lower() not in seen:
+            seen.add(normalized.lower())
+            unique.append(normalized)
+    return unique
+
+
+# Collects the href of every <a> tag, and separately those in the first cell of table rows
+class AnchorParser(HTMLParser):
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url
+        self.links = []
+        self.first_cell_links = []
+        self.cell_index = -1
+        self.in_cell = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self.cell_index = -1
+        elif tag in ("td", "th"):
+            self.cell_index += 1
+            self.in_cell = True
+        elif tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                # SSH addresses (git@host:owner/repo) are not URLs and would be joined as a relative path
+                link = href.strip() if repo_url_pattern.match(href.strip()) else urljoin(self.base_url, href)
+                self.links.append(link)
+                if self.in_cell and self.cell_index == 0:
+                    self.first_cell_links.append(link)
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th"):
+            self.in_cell = False
+
+
+# Scripts and data documents (JSON, CSV, text, YAML) referenced from a page or a script, e.g. the
+# "data/projects.json" a single page app downloads to render its table
+loaded_file_pattern = re.compile(r"""["'(=]\s*([^"'()\s<>]+\.(js|json|csv|tsv|txt|ya?ml))(?:\?[^"'()\s<>]*)?["')\s>]""",
+                                 re.IGNORECASE)
+
+
+# (script urls, data document urls) loaded by a page, from its own site only: scripts and
+# documents of other sites (libraries on a CDN...) do not list the projects
+def loaded_files(text, base_url):
+    scripts, documents = [], []
+    site = urlsplit(base_url).netloc
+    for match in loaded_file_pattern.finditer(text):
+        url = urldefrag(urljoin(base_url, match.group(1)))[0]
+        if urlsplit(url).netloc != site:
+            continue
+        files = scripts if match.group(2).lower() == "js" else documents
+        if url not in files:
+            files.append(url)
+    return scripts, documents
+
+
+def iter_json_strings(data):
+    if isinstance(data, str):
+        yield data
+    elif isinstance(data, dict):
+        for value in data.values():
+            yield from iter_json_strings(value)
+    elif isinstance(data, list):
+        for value in data:
+            yield from iter_json_strings(value)
+
+
+# Repository URLs of a downloaded page: every string of a JSON document, the anchors of the first
+# table column of an HTML page (all anchors if it has no table), or any URL found in other text
+def extract_repo_links(text, base_url=""):
+    stripped = text.lstrip()
+    if stripped.startswith(("{", "[")):
+        try:
+            return [url for url in iter_json_strings(json.loads(text)) if normalize_repo_url(url)]
+        except ValueError:
+            pass
+
+    if "<a" in text.lower():
+        parser = AnchorParser(base_url)
+        parser.feed(text)
+        links = parser.first_cell_links or parser.links
+        return [url for url in links if normalize_repo_url(url)]
+
+    return [match.group(0) for match in repo_url_pattern.finditer(text)]
+
+
+def fetch_with_urllib(url):
+    request = urllib.request.Request(url, headers={"User-Agent": "project-link-harvester"})
+    with urllib.request.urlopen(request, timeout=fetch_timeout) as response:
+        return response.read().decode(response.headers.get_content_charset() or "utf-8", errors="replace")
+
+
+# Download all pages at the same time. aiohttp is used when installed, otherwise urllib on threads.
+# Returns {url: text}; pages that cannot be downloaded are reported and left out.
+async def fetch_pages(urls):
+    # The part after # is only used by the browser (e.g. the route of a single page app)
+    urls = [urldefrag(url)[0] for url in urls]
+    try:
+        import aiohttp
+    except ImportError:
+        aiohttp = None
+
+    async def fetch(session, url):
+        try:
+            if session is None:
+                return url, await asyncio.to_thread(fetch_with_urllib, url)
+            async with session.get(url) as response:
+                response.raise_for_status()
+                return url, await response.text(errors="replace")
+        except Exception as e:
+            print(f"Error fetching {url}: {type(e).__name__}: {e}")
+            return url, None
+
+    if aiohttp is None:
+        results = await asyncio.gather(*(fetch(None, url) for url in urls))
+    else:
+        timeout = aiohttp.ClientTimeout(total=fetch_timeout)
+        async with aiohttp.ClientSession(timeout=timeout, headers={"User-Agent": "project-link-harvester"}) as session:
+            results = await asyncio.gather(*(fetch(session, url) for url in urls))
+    return {url: text for url, text in results if text is not None}
+
+
+# Data documents loaded by the pages, directly or by their scripts. The scripts are only read to
+# find the documents: their own URLs (licenses, issue trackers of libraries) are not project links.
+async def find_data_documents(pages):
+    scripts, documents = [], []
+    for url, text in pages.items():
+        page_scripts, page_documents = loaded_files(text, url)
+        scripts += [script for script in page_scripts if script not in scripts]
+        documents += [document for document in page_documents if document not in documents]
+
+    for url, text in (await fetch_pages(scripts)).items():
+        documents += [document for document in loaded_files(text, url)[1] if document not in documents]
+    return [document for document in documents if document not in pages]
+
+
+# Normalised, deduplicated repository URLs found on the given pages, in page order. With
+# follow_data, the data documents the pages load are read as well, so pages rendered by
+# JavaScript can be harvested without a browser.
+async def harvest_links(source_urls, follow_data=False):
+    pages = await fetch_pages(source_urls)
+    if follow_data:
+        pages.update(await fetch_pages(await find_data_documents(pages)))
+    links = []
+    for url, text in pages.items():
+        links.extend(extract_repo_links(text, url))
+    return dedupe_repo_urls(links)
+
+
+# Check that a repository exists and can be read, with `git ls-remote` (no objects are downloaded).
+# Returns (url, HEAD sha or None, error message or None).
+async def ls_remote(url, semaphore):
+    async with semaphore:
+        # Never wait for credentials: private or deleted repositories fail instead of prompting
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0", GIT_ASKPASS="")
+        process = await asyncio.create_subprocess_exec("git", "ls-remote", url, "HEAD", env=env,
+                                                       stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE)
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), ls_remote_timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return url, None, f"no answer within {ls_remote_timeout}s"
+
+    if process.returncode != 0:
+        return url, None, stderr.decode("utf-8", errors="replace").strip() or f"exit code {process.returncode}"
+    fields = stdout.decode().split()
+    return url, fields[0] if fields else None, None
+
+
+# Run `git ls-remote` on up to `concurrency` repositories at a time.
+# Returns {url: {"head": sha or None, "error": message or None}}, in the order of urls.
+async def check_repositories(urls, concurrency=16):
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results = await asyncio.gather(*(ls_remote(url, semaphore) for url in urls))
+    return {url: {"head": head, "error": error} for url, head, error in results}
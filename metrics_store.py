@@ -0,0 +1,79 @@
+import os
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Columnar metrics dataset, one Parquet partition per repository (repo=<name>/metrics.parquet)
+output_dir = "rminer-outputs"
+dataset_dir = os.path.join(output_dir, "metrics_dataset")
+
+# Type of every metric column written by part3
+metric_types = {
+    "SEXP": pa.int64(), "CBO": pa.int64(), "WMC": pa.int64(), "RFC": pa.int64(), "ELOC": pa.int64(),
+    "NOM": pa.int64(), "NOPM": pa.int64(), "DIT": pa.int64(), "NOC": pa.int64(), "NOF": pa.int64(),
+    "NOSF": pa.int64(), "NOPF": pa.int64(), "NOSM": pa.int64(), "NOSI": pa.int64(), "HsLCOM": pa.float64(),
+    "C3": pa.float64(), "ComRead": pa.float64(), "ND": pa.int64(), "NS": pa.int64(), "NDEV": pa.int64(),
+    "AGE": pa.float64(), "FIX": pa.bool_(), "NUC": pa.int64(), "CEXP": pa.int64(), "REXP": pa.int64(),
+    "OEXP": pa.float64(), "EXP": pa.float64()
+}
+metric_columns = list(metric_types)
+
+metrics_schema = pa.schema(
+    [("commit hash", pa.string()), ("file", pa.string()), ("commit timestamp", pa.timestamp("s", tz="UTC"))]
+    + [(metric, metric_type) for metric, metric_type in metric_types.items()]
+)
+
+
+def repo_partition_path(repo_name, root=dataset_dir):
+    return os.path.join(root, f"repo={repo_name}", "metrics.parquet")
+
+
+# Write the metrics of one repository as its partition of the dataset, replacing the previous one.
+# commit_dates maps each commit hash to its (timezone aware) commit date.
+def write_repo_metrics(repo_name, metrics_rows, commit_dates, root=dataset_dir):
+    columns = {
+        "commit hash": [row["commit hash"] for row in metrics_rows],
+        "file": [row["file"] for row in metrics_rows],
+        "commit timestamp": [commit_dates.get(row["commit hash"]) for row in metrics_rows]
+    }
+    for metric in metric_columns:
+        columns[metric] = [row.get(metric) for row in metrics_rows]
+
+    table = pa.Table.from_pydict(columns, schema=metrics_schema)
+    path = repo_partition_path(repo_name, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Write next to the old file and swap, so readers never see a half written partition
+    temp_path = path + ".tmp"
+    pq.write_table(table, temp_path)
+    os.replace(temp_path, path)
+    return path
+
+
+# Read selected columns of one repository (memory mapped, other columns are never loaded)
+def read_repo_metrics(repo_name, columns=None, root=dataset_dir):
+    return pq.read_table(repo_partition_path(repo_name, root), columns=columns, memory_map=True).to_pandas()
+
+
+# Dataset over all repositories; the partition folder adds a "repo" column
+def open_dataset(root=dataset_dir):
+    return ds.dataset(root, format="parquet", partitioning="hive")
+
+
+# Read selected columns of several (or all) repositories into one DataFrame
+def read_metrics(columns=None, repos=None, root=dataset_dir):
+    dataset = open_dataset(root)
+    row_filter = pc.field("repo").isin(repos) if repos else None
+    if columns is not None and "repo" not in columns:
+        columns = ["repo"] + list(columns)
+    return dataset.to_table(columns=columns, filter=row_filter).to_pandas()
+
+
+# Aggregate metrics per repository across the dataset, e.g. aggregate_metrics(["WMC", "CBO"], ["mean", "max"])
+def aggregate_metrics(metrics, aggregations=("mean",), repos=None, root=dataset_dir):
+    table = open_dataset(root).to_table(columns=["repo"] + list(metrics),
+                                        filter=pc.field("repo").isin(repos) if repos else None)
+    grouped = table.group_by("repo").aggregate([(metric, aggregation) for metric in metrics
+                                                for aggregation in aggregations])
+    return grouped.to_pandas().set_index("repo").sort_index()
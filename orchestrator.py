@@ -0,0 +1,282 @@
+import os
+import json
+import argparse
+import multiprocessing
+from multiprocessing.connection import wait
+from datetime import datetime
+from pipeline_cache import open_cache
+from profiler import stage, start_profiling, stop_profiling
+
+# Paths and configuration
+repo_list_file = "project_links.txt"
+clone_dir = "cloned_repos"
+output_dir = "rminer-outputs"
+status_file = os.path.join(output_dir, "pipeline_status.json")
+
+# Memory reserved for one RefactoringMiner JVM, used to limit how many run at the same time
+miner_memory_mb = 4096
+
+# RefactoringMiner JVMs the mine stage of the repository processed by this process may run at once,
+# the permits its miner slot holds (set by run_repository)
+miner_permits = None
+
+
+# Stages of the per-repository pipeline. Every stage receives the same arguments and
+# is idempotent (work already done is found in the cache), so a failed repository can
+# simply be run again from the first stage.
+def clone_stage(repo_url, repo_name, repo_path, cache):
+    from part2 import clone_repository
+    clone_repository(repo_url, repo_path)
+    if not os.path.isdir(repo_path):
+        raise RuntimeError(f"cloning {repo_url} failed")
+
+
+def mine_stage(repo_url, repo_name, repo_path, cache):
+    import part2
+    if miner_permits:
+        part2.miner_workers = min(part2.miner_workers, miner_permits)
+    part2.mine_refactorings(repo_name, repo_path, cache)
+
+
+def extract_stage(repo_url, repo_name, repo_path, cache):
+    from part2 import extract_commit_data
+    extract_commit_data(repo_name, repo_path, cache)
+
+
+def metrics_stage(repo_url, repo_name, repo_path, cache):
+    from part3 import compute_repository_metrics
+    compute_repository_metrics(repo_name, repo_path, cache)
+
+
+default_stages = [
+    ("clone", clone_stage),
+    ("mine", mine_stage),
+    ("extract", extract_stage),
+    ("metrics", metrics_stage)
+]
+
+# Stages that start a RefactoringMiner JVM and are limited by the available memory
+memory_heavy_stages = {"mine"}
+
+
+def get_repo_name(repo_url):
+    return repo_url.rstrip("/").split("/")[-1].replace(".git", "")
+
+
+# Available memory in MB, or None when it cannot be determined
+def get_available_memory_mb():
+    try:
+        import psutil
+        return psutil.virtual_memory().available // (1024 * 1024)
+    except ImportError:
+        pass
+
+    try:
+        with open("/proc/meminfo", "r") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+
+    return None
+
+
+# Number of RefactoringMiner JVMs that fit in memory next to each other (at least one)
+def get_miner_slots(workers, memory_per_miner_mb=miner_memory_mb):
+    available_memory = get_available_memory_mb()
+    if available_memory is None or memory_per_miner_mb <= 0:
+        return workers
+    return max(1, min(workers, available_memory // memory_per_miner_mb))
+
+
+def load_status(path=status_file):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding='utf-8') as file:
+        return json.load(file)
+
+
+# Write the status file atomically, so an interrupted run never leaves it half written
+def save_status(status, path=status_file):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding='utf-8') as file:
+        json.dump(status, file, indent=4)
+    os.replace(temp_path, path)
+
+
+# Run every stage for one repository inside its own process.
+# Errors are returned instead of raised, so one repository cannot stop the others.
+def run_repository(repo_url, stages, miner_slot, repo_clone_dir, cache_path):
+    global miner_permits
+    miner_permits = getattr(miner_slot, "permits", None)
+    repo_name = get_repo_name(repo_url)
+    repo_path = os.path.join(repo_clone_dir, repo_name)
+    started = datetime.now()
+    completed_stages = []
+    stage_name = None
+
+    # Time every stage of the repository, saved to rminer-outputs/profiles/<repo>.pipeline.json
+    start_profiling(repo_name, "pipeline")
+    try:
+        cache = open_cache(cache_path)
+        try:
+            for stage_name, stage_function in stages:
+                if stage_name in memory_heavy_stages:
+                    with miner_slot, stage(stage_name):
+                        stage_function(repo_url, repo_name, repo_path, cache)
+                else:
+                    with stage(stage_name):
+                        stage_function(repo_url, repo_name, repo_path, cache)
+                completed_stages.append(stage_name)
+        finally:
+            cache.close()
+            stop_profiling()
+    except Exception as e:
+        return {
+            "repo": repo_name,
+            "url": repo_url,
+            "status": "failed",
+            "completed stages": completed_stages,
+            "failed stage": stage_name,
+            "error": f"{type(e).__name__}: {e}",
+            "seconds": (datetime.now() - started).total_seconds()
+        }
+
+    return {
+        "repo": repo_name,
+        "url": repo_url,
+        "status": "done",
+        "completed stages": completed_stages,
+        "seconds": (datetime.now() - started).total_seconds()
+    }
+
+
+# RefactoringMiner slots of one repository process: one permit of the semaphore per JVM the mine
+# stage runs at the same time (part2.miner_workers). Permits are taken under a lock shared by all
+# processes, so two repositories can never each hold part of what they need and wait for the other.
+# The parent process checks the count held when the process dies, so permits held by a crashed
+# process are given back instead of being lost for the run.
+class MinerSlot:
+    def __init__(self, semaphore, acquire_lock, permits=1):
+        self.semaphore = semaphore
+        self.acquire_lock = acquire_lock
+        self.permits = permits
+        self.held = multiprocessing.Value("i", 0)
+
+    def __enter__(self):
+        with self.acquire_lock:
+            for _ in range(self.permits):
+                self.semaphore.acquire()
+                self.held.value += 1
+
+    def __exit__(self, *exc_info):
+        self.release_if_held()
+
+    def release_if_held(self):
+        while self.held.value:
+            self.held.value -= 1
+            self.semaphore.release()
+
+
+# Body of a repository process: send the result of the repository back to the parent process
+def repository_process(connection, repo_url, stages, miner_slot, repo_clone_dir, cache_path):
+    connection.send(run_repository(repo_url, stages, miner_slot, repo_clone_dir, cache_path))
+    connection.close()
+
+
+# Run the pipeline for all repositories, at most `workers` at a time. Every repository runs in
+# its own process, so a process that dies (e.g. killed for using too much memory) only fails its
+# own repository. Repositories marked as done in the status file are skipped unless rerun is set.
+# miners_per_repository is the number of JVMs the mine stage of one repository runs at the same time.
+def run_pipeline(repo_urls, workers=None, stages=None, path_to_status_file=status_file, repo_clone_dir=clone_dir,
+                 cache_path=None, memory_per_miner_mb=miner_memory_mb, rerun=False, miners_per_repository=None):
+    workers = workers or os.cpu_count() or 1
+    if miners_per_repository is None:
+        from part2 import miner_workers as miners_per_repository
+    stages = stages or default_stages
+    cache_path = cache_path or os.path.join(output_dir, "pipeline_cache.sqlite")
+    os.makedirs(repo_clone_dir, exist_ok=True)
+
+    status = load_status(path_to_status_file)
+    pending = [url for url in repo_urls
+               if rerun or status.get(get_repo_name(url), {}).get("status") != "done"]
+    print(f"{len(repo_urls) - len(pending)} repositories already done, {len(pending)} to process")
+
+    for url in pending:
+        status[get_repo_name(url)] = {"repo": get_repo_name(url), "url": url, "status": "pending"}
+    save_status(status, path_to_status_file)
+
+    miner_count = get_miner_slots(workers * max(1, miners_per_repository), memory_per_miner_mb)
+    print(f"Running with {workers} workers and at most {miner_count} RefactoringMiner processes at a time")
+    miner_semaphore = multiprocessing.BoundedSemaphore(miner_count)
+    acquire_lock = multiprocessing.Lock()
+    # A repository wanting more JVMs than fit in memory runs as many as fit
+    permits_per_repository = max(1, min(miners_per_repository, miner_count))
+
+    # Receiving end of the result pipe of every running process -> (process, miner slot, url)
+    running = {}
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                url = pending.pop(0)
+                receiver, sender = multiprocessing.Pipe(duplex=False)
+                miner_slot = MinerSlot(miner_semaphore, acquire_lock, permits_per_repository)
+                process = multiprocessing.Process(target=repository_process,
+                                                  args=(sender, url, stages, miner_slot, repo_clone_dir, cache_path))
+                process.start()
+                # Only the child keeps the sending end, so the pipe reports end of file if it dies
+                sender.close()
+                running[receiver] = (process, miner_slot, url)
+
+            for receiver in wait(list(running)):
+                process, miner_slot, url = running.pop(receiver)
+                try:
+                    result = receiver.recv()
+                except EOFError:
+                    result = None
+                receiver.close()
+                process.join()
+
+                if result is None:
+                    # The process died without a result; retry the repository on the next run
+                    miner_slot.release_if_held()
+                    result = {"repo": get_repo_name(url), "url": url, "status": "failed",
+                              "error": f"worker process crashed with exit code {process.exitcode}"}
+
+                result["updated at"] = datetime.now().isoformat()
+                status[result["repo"]] = result
+                save_status(status, path_to_status_file)
+
+                if result["status"] == "done":
+                    print(f"Finished {result['repo']} in {result['seconds']:.1f}s")
+                else:
+                    print(f"Error processing {result['repo']}: {result['error']}")
+    finally:
+        # Interrupted (e.g. Ctrl+C): stop the repositories still running, they stay pending in the status file
+        for process, miner_slot, url in running.values():
+            process.terminate()
+            process.join()
+
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the clone, mine, extract and metrics stages in parallel")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--miner-memory-mb", type=int, default=miner_memory_mb,
+                        help="memory reserved for each RefactoringMiner JVM")
+    parser.add_argument("--repo-list", default=repo_list_file, help="file with one repository URL per line")
+    parser.add_argument("--status-file", default=status_file, help="status file used to resume interrupted runs")
+    parser.add_argument("--rerun", action="store_true", help="also process repositories that are already done")
+    args = parser.parse_args()
+
+    with open(args.repo_list, "r") as file:
+        repo_urls = [line.strip() for line in file if line.strip()]
+
+    final_status = run_pipeline(repo_urls, workers=args.workers, path_to_status_file=args.status_file,
+                                memory_per_miner_mb=args.miner_memory_mb, rerun=args.rerun)
+
+    failed = [repo for repo, result in final_status.items() if result["status"] != "done"]
+    print(f"Pipeline completed, {len(final_status) - len(failed)} repositories done, {len(failed)} failed")
@@ -1,34 +1,83 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-import time
+import asyncio
+import argparse
+from link_harvester import harvest_links, dedupe_repo_urls, check_repositories
 
-service = Service(ChromeDriverManager().install())
-driver = webdriver.Chrome(service=service)
+# Page listing the studied projects. It is rendered by JavaScript from a data document, so by
+# default the documents the page and its scripts load are read over HTTP, without a browser.
+# Other pages or JSON documents with the same list can be given with --source.
+projects_page = "https://aserg-ufmg.github.io/why-we-refactor/#/projects"
+source_urls = [projects_page]
+project_links_file = "project_links.txt"
 
-try:
-    # Open the target website
-    driver.get("https://aserg-ufmg.github.io/why-we-refactor/#/projects")
 
-    # Wait for the table to load
-    wait = WebDriverWait(driver, 10)
-    wait.until(EC.presence_of_element_located((By.CLASS_NAME, "table")))  # Wait for the table to be present
+# Read the project links from the rendered table with a full Chrome browser (slow, needs a display
+# or headless Chrome and downloads a driver at startup); used when the links only exist after rendering
+def harvest_with_browser(page_url=projects_page):
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.chrome.service import Service
+    from webdriver_manager.chrome import ChromeDriverManager
 
-    # Identify and retrieve all project links from the table
-    project_elements = driver.find_elements(By.XPATH, "//table/tbody/tr/td[1]/a")  # Get all <a> tags in the first <td> of each row
+    service = Service(ChromeDriverManager().install())
+    driver = webdriver.Chrome(service=service)
 
-    # Extract href attributes for each project link
-    project_links = [element.get_attribute("href") for element in project_elements]
+    try:
+        # Open the target website
+        driver.get(page_url)
+
+        # Wait for the table to load
+        wait = WebDriverWait(driver, 10)
+        wait.until(EC.presence_of_element_located((By.CLASS_NAME, "table")))  # Wait for the table to be present
+
+        # Identify and retrieve all project links from the table
+        project_elements = driver.find_elements(By.XPATH, "//table/tbody/tr/td[1]/a")  # Get all <a> tags in the first <td> of each row
+
+        # Extract href attributes for each project link
+        return [element.get_attribute("href") for element in project_elements]
+
+    finally:
+        driver.quit()  # Close the browser
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect the repository links of the studied projects")
+    parser.add_argument("--source", action="append", help="page or JSON document to read links from (repeatable)")
+    parser.add_argument("--browser", action="store_true", help="render the projects page with Chrome instead")
+    parser.add_argument("--check", action="store_true", help="keep only repositories that answer `git ls-remote`")
+    parser.add_argument("--concurrency", type=int, default=16, help="repositories checked at the same time")
+    parser.add_argument("--output", default=project_links_file, help="file to write the links to")
+    args = parser.parse_args()
+
+    # Fetch and parse the pages over HTTP, links are normalised and deduplicated
+    if args.browser:
+        project_links = dedupe_repo_urls(harvest_with_browser())
+    else:
+        project_links = asyncio.run(harvest_links(args.source or source_urls, follow_data=not args.source))
+        if not project_links and not args.source:
+            print("No project links found over HTTP, rendering the projects page with Chrome")
+            try:
+                project_links = dedupe_repo_urls(harvest_with_browser())
+            except Exception as e:
+                # ImportError without selenium, WebDriverException when Chrome or its driver cannot start
+                print(f"Cannot start the browser: {type(e).__name__}: {e}")
+
+    # Keep the previous list rather than overwriting it with nothing
+    if not project_links:
+        raise SystemExit("No project links found, pass --source with a page or JSON listing them, or use --browser")
+
+    # Drop repositories that were deleted, renamed or made private
+    if args.check and project_links:
+        checks = asyncio.run(check_repositories(project_links, args.concurrency))
+        for link, check in checks.items():
+            if check["error"]:
+                print(f"Skipping {link}: {check['error']}")
+        project_links = [link for link, check in checks.items() if not check["error"]]
 
     # Write project links to a text file
-    with open("project_links.txt", "w") as file:
+    with open(args.output, "w") as file:
         for link in project_links:
             file.write(link + "\n")
 
-    print("Project links have been saved to project_links.txt")
-
-finally:
-    driver.quit()  # Close the browser
+    print(f"{len(project_links)} project links have been saved to {args.output}")
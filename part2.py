@@ -1,114 +1,253 @@
 import subprocess
 import os
 import json
-from pydriller import RepositoryMining  # Import RepositoryMining from PyDriller
+from pydriller import RepositoryMining, GitRepository  # Import RepositoryMining and GitRepository from PyDriller
+from commit_metadata import read_commit_metadata, read_blob_ids
+import repo_clone
+from commit_scope import scope, window_commits, window_ranges, select_commits
+from refactoring_miner import RefactoringMinerCli, split_commit_ranges, mine_ranges
+from refactorings_json import write_refactorings
+from diff_store import DiffWriter, diff_key, diff_output_path
+from profiler import stage, add_counts, start_profiling, stop_profiling
+from pipeline_cache import (open_cache, check_repo_state, get_last_head, set_last_head, store_refactorings,
+                            load_refactoring_shas, iter_refactorings, has_commit_data, store_commit_data,
+                            load_commit_messages, iter_diffs)
 
 # Paths and configuration
 refminer_path = r"C:\MyWork\settup\RefactoringMiner\build\libs\RM-fat.jar"
 repo_list_file = "project_links.txt"
 clone_dir = "cloned_repos"
 output_dir = "rminer-outputs"
+diff_compression = "gzip"  # Compression of the diff output: None, "gzip" or "zstd"
+clone_mode = "full"  # "full", "blobless" (partial clone, blobs fetched in batches before each stage) or "shallow"
+shallow_depth = 1  # Number of commits kept by the "shallow" clone mode
+miner_workers = 1  # RefactoringMiner runs working on commit ranges of the same repository at the same time
+miner_range_size = 500  # First-parent commits per RefactoringMiner run
+clone_reference = None  # Bare repository sharing its objects with the clones, e.g. os.path.join(clone_dir, "shared.git")
 os.makedirs(clone_dir, exist_ok=True)
 os.makedirs(output_dir, exist_ok=True)
 
-# Increase Git buffer size for larger repositories
-subprocess.run(["git", "config", "--global", "http.postBuffer", "524288000"])
-
-# Read repository links
-with open(repo_list_file, "r") as file:
-    repo_urls = [line.strip() for line in file if line.strip()]
-
-for repo_url in repo_urls:
-    repo_name = repo_url.split("/")[-1].replace(".git", "")
-    repo_path = os.path.join(clone_dir, repo_name)
+# Miner used on the commit ranges, replaced by refactoring_miner.FakeMiner to run without Java
+miner = RefactoringMinerCli(refminer_path)
+
+
+# Clone repository, or fetch the new commits of an existing clone
+def clone_repository(repo_url, repo_path):
+    with stage("git clone"):
+        # Full clones add their objects to the shared store, so forks cloned later only download what differs
+        if clone_reference and clone_mode == "full":
+            repo_clone.update_reference_store(clone_reference, os.path.basename(repo_path), repo_url)
+        repo_clone.clone_repository(repo_url, repo_path, clone_mode, shallow_depth, clone_reference)
+
+
+# Mine the commits between start (excluded, None for the first commit) and end, split into commit
+# ranges mined concurrently. The progress is saved under state_stage after every range, so an
+# interrupted run continues from the last range that finished instead of starting over.
+def mine_commit_range(repo_name, repo_path, cache, state_stage, start, end):
+    ranges = split_commit_ranges(repo_path, start, end, miner_range_size)
+    if not ranges:
+        set_last_head(cache, repo_name, state_stage, end)
+        return
+
+    # RefactoringMiner reads the repository through JGit, which cannot fetch the blobs missing from
+    # a partial clone, so fetch the Java files changed by the commits it analyses beforehand
+    with stage("blob prefetch"):
+        fetched = repo_clone.prefetch_blobs(repo_path, [f"{start}..{end}"] if start else [end])
+    add_counts("blob prefetch", files=fetched)
+
+    finished = {}
+    next_range = 0
+    with stage("refactoringminer"):
+        for index, commits in mine_ranges(miner, repo_path, ranges, miner_workers,
+                                          os.path.join(output_dir, f"{repo_name}_refactorings")):
+            finished[index] = commits
+
+            # Ranges finish in any order; they are cached in history order, together with the progress
+            while next_range in finished:
+                commits = finished.pop(next_range)
+                store_refactorings(cache, repo_name, commits)
+                set_last_head(cache, repo_name, state_stage, ranges[next_range][1])
+                add_counts("refactoringminer", commits=len(commits))
+                next_range += 1
+
+
+# Run RefactoringMiner on the commits added since the last run and cache its results
+def mine_history(repo_name, repo_path, cache):
+    # Check what changed since the last run of this repository
+    head, last_head = check_repo_state(cache, repo_name, repo_path, "mining")
+    if head is None:
+        raise RuntimeError(f"cannot read HEAD of {repo_path}")
+
+    if last_head == head:
+        print(f"{repo_name} has no new commits since the last run, using cached results")
+        return
+
+    # Mine the whole history, or only the commits added since the last run
+    mine_commit_range(repo_name, repo_path, cache, "mining", last_head, head)
+
+
+# Run RefactoringMiner on the commits of the window set in the commit scope only
+def mine_window(repo_name, repo_path, cache, window):
+    if not window:
+        print(f"{repo_name} has no commits in the selected window")
+        return
+
+    # A window has one commit range per tip. Ranges are remembered by their start and end;
+    # a range inside the already mined history needs no run
+    mined_head = get_last_head(cache, repo_name, "mining")
+    for start, end in window_ranges(repo_path, window):
+        window_stage = f"mining {start}..{end}"
+        window_head = get_last_head(cache, repo_name, window_stage)
+        if window_head == end or (
+                mined_head and subprocess.run(["git", "-C", repo_path, "merge-base", "--is-ancestor", end, mined_head],
+                                              capture_output=True).returncode == 0):
+            print(f"Commits {start}..{end} of {repo_name} were mined before, using cached results")
+            continue
+
+        # Continue an interrupted run of the same range from the last part it finished
+        mine_commit_range(repo_name, repo_path, cache, window_stage, window_head or start, end)
+
+
+# Shas of the cached refactoring commits selected by the commit scope (all of them by default)
+def load_selected_shas(repo_name, repo_path, cache):
+    return select_commits(repo_path, [sha for sha in load_refactoring_shas(cache, repo_name) if sha])
+
+
+# Mine the refactorings of the commits selected by the commit scope (the whole history by default)
+def mine_refactorings(repo_name, repo_path, cache):
     output_file = os.path.join(output_dir, f"{repo_name}_refactorings.json")
+
+    window = window_commits(repo_path, scope)
+    if window is None:
+        mine_history(repo_name, repo_path, cache)
+    else:
+        mine_window(repo_name, repo_path, cache, window)
+
+    # Save the selected refactorings (old and new commits) to JSON file, streamed from the cache one
+    # commit at a time, with a sidecar index (sha, offset, types) for the later stages
+    with stage("refactorings output"):
+        selected_shas = load_selected_shas(repo_name, repo_path, cache)
+        write_refactorings(output_file, iter_refactorings(cache, repo_name, selected_shas))
+
+
+# Yield the PyDriller commits of all given SHAs with one ordered traversal of the repository,
+# instead of opening the repository again for every commit with RepositoryMining(single=...)
+def iter_commits(repo_path, commit_shas):
+    remaining = set(commit_shas)
+    if not remaining:
+        return
+
+    for commit in RepositoryMining(repo_path, only_commits=list(remaining)).traverse_commits():
+        remaining.discard(commit.hash)
+        yield commit
+        if not remaining:
+            return
+
+    # Commits that are not reachable from HEAD are read one by one from the same open repository
+    git_repo = GitRepository(repo_path)
+    for commit_sha in commit_shas:
+        if commit_sha in remaining:
+            remaining.discard(commit_sha)
+            try:
+                commit = git_repo.get_commit(commit_sha)
+            except Exception as e:
+                print(f"Error reading commit {commit_sha}: {e}")
+                continue
+            yield commit
+
+
+# Extract commit messages and diffs of the refactoring commits that are not cached yet
+def extract_commit_data(repo_name, repo_path, cache):
     commit_message_file = os.path.join(output_dir, f"{repo_name}_commit_messages.json")
-    diff_output_file = os.path.join(output_dir, f"{repo_name}_commit_diffs.json")
-
-    # Clone repository
-    if not os.path.exists(repo_path):
-        subprocess.run(["git", "clone", repo_url, repo_path])
-
-    # Run RefactoringMiner and save results
-    command = ["java", "-jar", refminer_path, "-a", repo_path, "-json", output_file]
-    subprocess.run(command)
-
-    # Load refactoring data and extract commit messages
-    try:
-        with open(output_file, "r", encoding="utf-8") as json_file:
-            refactoring_data = json.load(json_file)
-            commit_messages = []
-            diffs = []
-
-            for refactoring in refactoring_data.get("commits", []):
-                commit_sha = refactoring.get("sha1")
-                if commit_sha:
-                    # Fetch commit message
-                    commit_message_cmd = ["git", "-C", repo_path, "log", "--format=%B", "-n", "1", commit_sha]
-                    commit_message_result = subprocess.run(commit_message_cmd, capture_output=True, text=True,
-                                                           encoding='utf-8')
-
-                    # Check if the command was successful
-                    if commit_message_result.returncode != 0:
-                        print(f"Error fetching commit message for {commit_sha}: {commit_message_result.stderr}")
-                        commit_message = "Unknown commit message"  # Default value
-                    else:
-                        commit_message = commit_message_result.stdout.strip() or "Unknown commit message"
-
-                    # Determine previous commit hash manually
-                    previous_commit_command = ["git", "-C", repo_path, "rev-list", "--parents", "-n", "1", commit_sha]
-                    previous_commit_result = subprocess.run(previous_commit_command, capture_output=True, text=True,
-                                                            encoding='utf-8')
-
-                    # Check if the command was successful
-                    if previous_commit_result.returncode != 0:
-                        print(f"Error fetching previous commit for {commit_sha}: {previous_commit_result.stderr}")
-                        previous_commit_hash = None
-                    else:
-                        previous_commit_hash = previous_commit_result.stdout.split()[
-                            1] if previous_commit_result.stdout else None
-
-                    # Check if it's the first commit (no previous commit hash)
-                    if previous_commit_hash is None:
-                        first_commit_info = {
-                            "commit hash": commit_sha,
-                            "commit message": commit_message,
-                            # "previous commit hash": "None (First commit)"
-                        }
-                        commit_messages.append(first_commit_info)
-                    else:
-                        commit_messages.append({
-                            "commit hash": commit_sha,
-                            "commit message": commit_message,
-                            # "previous commit hash": previous_commit_hash
-                        })
-
-                    # Calculate diff data with PyDriller
-                    for commit in RepositoryMining(repo_path, single=commit_sha).traverse_commits():
-                        if commit.hash == commit_sha:
-                            for modified_file in commit.modifications:
-                                diff_data = {
-                                    "commit hash": commit.hash,
-                                    "previous commit hash": previous_commit_hash,
-                                    "diff stats": {
-                                        "file_path": modified_file.filename,
-                                        "additions": modified_file.added,
-                                        "deletions": modified_file.removed
-                                    },
-                                    "diff content": modified_file.diff  # Raw diff content for the file
-                                }
-                                diffs.append(diff_data)
-                            break
-
-            # Save commit messages to JSON file
-            with open(commit_message_file, "w", encoding='utf-8') as cm_file:
-                json.dump(commit_messages, cm_file, indent=4)
-
-            # Save diff data to JSON file
-            with open(diff_output_file, "w", encoding='utf-8') as diff_file:
-                json.dump(diffs, diff_file, indent=4)
-
-    except Exception as e:
-        print(f"Error processing {repo_name}: {e}")
-
-print("Refactoring, commit message, and commit diff data have been saved.")
+    diff_output_file = diff_output_path(os.path.join(output_dir, f"{repo_name}_commit_diffs"), diff_compression)
+
+    # Read the message and parents of all new refactoring commits through a single git process
+    selected_shas = load_selected_shas(repo_name, repo_path, cache)
+    commit_shas = [commit_sha for commit_sha in selected_shas if not has_commit_data(cache, repo_name, commit_sha)]
+    with stage("commit metadata"):
+        commit_metadata = read_commit_metadata(repo_path, commit_shas)
+        # Blob ids of the changed files, which key the deduplicated diff bodies
+        commit_blob_ids = read_blob_ids(repo_path, commit_shas)
+    add_counts("commit metadata", commits=len(commit_shas))
+
+    # PyDriller reads both sides of every changed file; fetch the blobs missing from a partial clone at once
+    with stage("blob prefetch"):
+        fetched = repo_clone.prefetch_blobs(repo_path, pathspec=None, commit_shas=commit_shas)
+    add_counts("blob prefetch", files=fetched)
+
+    # Walk all new refactoring commits in one traversal and cache each one as it is read
+    for commit in iter_commits(repo_path, commit_shas):
+        with stage("diff extraction", commit=commit.hash):
+            commit_sha = commit.hash
+            metadata = commit_metadata.get(commit_sha)
+            if metadata is None:
+                print(f"Error fetching commit metadata for {commit_sha}: commit not found in {repo_path}")
+                commit_message = "Unknown commit message"  # Default value
+                previous_commit_hash = None
+            else:
+                commit_message = metadata["message"] or "Unknown commit message"
+                # Previous commit is the first parent (None for the first commit)
+                previous_commit_hash = metadata["parents"][0] if metadata["parents"] else None
+
+            # Calculate diff data with PyDriller
+            commit_diffs = []
+            blob_ids = commit_blob_ids.get(commit_sha, {})
+            for modified_file in commit.modifications:
+                diff_data = {
+                    "commit hash": commit.hash,
+                    "previous commit hash": previous_commit_hash,
+                    "diff stats": {
+                        "file_path": modified_file.filename,
+                        "additions": modified_file.added,
+                        "deletions": modified_file.removed
+                    },
+                    # Diff bodies are deduplicated by the blob pair they were computed from
+                    "diff key": diff_key(blob_ids.get((modified_file.old_path, modified_file.new_path)),
+                                         modified_file.diff),
+                    "diff content": modified_file.diff  # Raw diff content for the file
+                }
+                commit_diffs.append(diff_data)
+
+            # Cache the commit so later runs do not fetch it again
+            store_commit_data(cache, repo_name, commit_sha, commit_message, previous_commit_hash, commit_diffs)
+        add_counts("diff extraction", commits=1, files=len(commit_diffs))
+
+    # Only the selected commits are written, the cache may hold commits of other windows or samples
+    selected_shas = set(selected_shas)
+    with stage("diff output"):
+        # Save commit messages to JSON file
+        with open(commit_message_file, "w", encoding='utf-8') as cm_file:
+            json.dump([commit_message for commit_message in load_commit_messages(cache, repo_name)
+                       if commit_message["commit hash"] in selected_shas], cm_file, indent=4)
+
+        # Stream diff data to a JSON Lines file, one record per commit file
+        with DiffWriter(diff_output_file) as diff_writer:
+            for diff_data in iter_diffs(cache, repo_name):
+                if diff_data["commit hash"] in selected_shas:
+                    diff_writer.write(diff_data)
+
+
+if __name__ == "__main__":
+    # Cache of already processed commits, so re-runs only handle new commits
+    cache = open_cache()
+
+    # Read repository links
+    with open(repo_list_file, "r") as file:
+        repo_urls = [line.strip() for line in file if line.strip()]
+
+    for repo_url in repo_urls:
+        repo_name = repo_url.split("/")[-1].replace(".git", "")
+        repo_path = os.path.join(clone_dir, repo_name)
+
+        # Time every stage of the repository, saved to rminer-outputs/profiles/<repo>.part2.json
+        start_profiling(repo_name, "part2")
+        try:
+            clone_repository(repo_url, repo_path)
+            mine_refactorings(repo_name, repo_path, cache)
+            extract_commit_data(repo_name, repo_path, cache)
+        except Exception as e:
+            print(f"Error processing {repo_name}: {e}")
+        finally:
+            stop_profiling()
+
+    print("Refactoring, commit message, and commit diff data have been saved.")
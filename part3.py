@@ -1,11 +1,19 @@
 import os
 import json
-import math
 import re
+import subprocess
 from pydriller import RepositoryMining
-from javalang.parse import parse as javalang_parse
 import git
-from datetime import datetime, timedelta
+from history_index import build_history_index, compute_process_metrics, empty_process_metrics
+from java_parse_cache import ParseCache
+from repo_clone import prefetch_blobs
+from type_index import compute_type_metrics
+from metrics_store import write_repo_metrics
+from commit_scope import window_commits, window_tips, select_commits
+from refactorings_json import load_index
+from profiler import stage, add_counts, start_profiling, stop_profiling
+from pipeline_cache import (open_cache, check_repo_state, get_new_commits, set_last_head, store_history,
+                            load_history_index, store_metrics, load_metrics)
 
 # Paths and configuration for output directories
 repo_list_file = "project_links.txt"
@@ -16,91 +24,72 @@ os.makedirs(output_dir, exist_ok=True)
 
 
 # Helper function to calculate metrics
-def calculate_metrics(repo_path, commit_sha):
+def calculate_metrics(repo_path, commit_sha, history_index=None, parse_cache=None, type_metrics=None,
+                      process_metrics=None):
     metrics_data = []
 
+    # Build the history index, type and process metrics if the caller did not provide them for this repository
+    if history_index is None:
+        history_index = build_history_index(repo_path)
+    if process_metrics is None:
+        process_metrics = compute_process_metrics(history_index, [commit_sha])
+    if parse_cache is None:
+        parse_cache = ParseCache()
+    if type_metrics is None:
+        type_metrics = compute_type_metrics(repo_path, [commit_sha], parse_cache)
+    commit_type_metrics = type_metrics.get(commit_sha, {})
+
     # Fetch the specific commit using RepositoryMining
     for commit in RepositoryMining(repo_path, single=commit_sha).traverse_commits():
         if commit.hash == commit_sha:
             for modified_file in commit.modifications:
                 if modified_file.filename.endswith('.java') and modified_file.source_code:
-                    # Parse the file's source code with javalang for class-level analysis
-                    tree = javalang_parse(modified_file.source_code)
-
                     # Initialize metric variables
                     ND, NS, NDEV, NUC, CEXP, REXP, OEXP, EXP = 0, 0, 0, 0, 0, 0, 0, 0
                     SEXP, CBO, WMC, RFC, ELOC, NOM, NOPM, DIT, NOC = 0, 0, 0, 0, 0, 0, 0, 0, 0
                     NOF, NOSF, NOPF, NOSM, NOSI, HsLCOM, C3, ComRead = 0, 0, 0, 0, 0, 0, 0, 0
 
-                    # Process class and method details
-                    for path, node in tree:
-                        if isinstance(node, javalang.tree.ClassDeclaration):
-                            # Metrics on class level
-                            classes_in_file = [node]  # List of class declarations
-                            NOM = len([m for m in node.methods])  # Number of methods
-                            NOPM = len([m for m in node.methods if m.modifiers == 'public'])
-                            NOF = len(node.fields)
-                            NOSF = len([f for f in node.fields if 'static' in f.modifiers])
-                            NOPF = len([f for f in node.fields if 'public' in f.modifiers])
-
-                            # Compute depth of inheritance (DIT)
-                            DIT = 1  # Assumes a flat hierarchy, could expand with class hierarchies
-
-                            # Compute number of direct children (NOC) and Weighted Methods per Class (WMC)
-                            WMC = sum(m.cyclomatic_complexity for m in node.methods if m.body)
-                            NOC = 0  # This would require analyzing inheritance across files
-
-                            # ELOC (Effective Lines of Code)
-                            ELOC = len([line for line in modified_file.source_code.splitlines() if line.strip()])
-
-                            # RFC - Response for a Class: count methods + remote methods called recursively
-                            RFC = NOM + len([call for m in node.methods for call in m.body if hasattr(call, 'method')])
-
-                    # Calculate additional file-level metrics using the commit history
-                    file_commits = [
-                        c for c in RepositoryMining(repo_path).traverse_commits()
-                        if any(m.filename == modified_file.filename for m in c.modifications)
-                    ]
-                    authors = set(c.author.name for c in file_commits)
-                    NDEV = len(authors)
+                    file_path = modified_file.new_path or modified_file.old_path
+
+                    # Class-level analysis with javalang; files whose blob was seen before are not parsed again
+                    analysis = parse_cache.analyze(modified_file.source_code)
+                    if "error" in analysis:
+                        print(f"Error parsing {modified_file.filename} in {commit.hash}: {analysis['error']}")
+                    else:
+                        class_metrics = analysis["class metrics"]
+                        NOM = class_metrics["NOM"]  # Number of methods
+                        NOPM = class_metrics["NOPM"]
+                        NOF = class_metrics["NOF"]
+                        NOSF = class_metrics["NOSF"]
+                        NOPF = class_metrics["NOPF"]
+                        WMC = class_metrics["WMC"]
+                        RFC = class_metrics["RFC"]
+                        ELOC = class_metrics["ELOC"]
+
+                    # Depth of inheritance (DIT), number of children (NOC) and coupling (CBO)
+                    # from the repository-wide type index (git paths always use "/")
+                    file_type_metrics = commit_type_metrics.get(file_path.replace(os.sep, "/"), {})
+                    DIT = file_type_metrics.get("DIT", 0)
+                    NOC = file_type_metrics.get("NOC", 0)
+                    CBO = file_type_metrics.get("CBO", 0)
+
+                    # File-level metrics from the history, computed for all files of the repository at once
+                    file_process_metrics = process_metrics.get((commit.hash, file_path), empty_process_metrics)
+                    NDEV = file_process_metrics["NDEV"]
+                    AGE = file_process_metrics["AGE"]
+                    NUC = file_process_metrics["NUC"]
+                    CEXP = file_process_metrics["CEXP"]
+                    REXP = file_process_metrics["REXP"]
+                    OEXP = file_process_metrics["OEXP"]
+                    EXP = file_process_metrics["EXP"]
 
                     directories = {os.path.dirname(mod.filename) for mod in commit.modifications}
                     ND = len(directories)
                     subsystems = {os.path.dirname(mod.filename).split(os.sep)[0] for mod in commit.modifications}
                     NS = len(subsystems)
 
-                    time_deltas = [(commit.committer_date - file_commit.committer_date).days
-                                   for file_commit in file_commits if file_commit.hash != commit.hash]
-                    AGE = sum(time_deltas) / len(time_deltas) if time_deltas else 0
-
                     FIX = bool(re.search(r'\b[A-Za-z]+-\d+\b', commit.msg))
 
-                    NUC = len([c for c in RepositoryMining(repo_path).traverse_commits() if any(
-                        m.filename == modified_file.filename for m in c.modifications)])
-
-                    CEXP = sum(1 for c in file_commits if c.author.name == commit.author.name)
-
-                    one_month_ago = datetime.now(commit.committer_date.tzinfo) - timedelta(days=30)
-                    REXP = len([c for c in file_commits if
-                                c.author.name == commit.author.name and c.committer_date > one_month_ago])
-
-                    contributions = {
-                        author: sum(mod.added for c in file_commits for mod in c.modifications if
-                                    mod.filename == modified_file.filename and c.author.name == author)
-                        for author in authors
-                    }
-                    highest_contributor = max(contributions, key=contributions.get, default=None)
-                    project_total_additions = sum(
-                        mod.added for c in RepositoryMining(repo_path).traverse_commits() for mod in c.modifications)
-                    highest_contributor_additions = contributions[highest_contributor] if highest_contributor else 0
-                    OEXP = (
-                                       highest_contributor_additions / project_total_additions) * 100 if project_total_additions > 0 else 0
-
-                    author_experience = [sum(1 for mod in c.modifications if mod.filename == modified_file.filename)
-                                         for c in RepositoryMining(repo_path).traverse_commits() for author in authors]
-                    exp_product = math.prod(author_experience) if author_experience else 0
-                    EXP = exp_product ** (1 / len(author_experience)) if author_experience else 0
-
                     # Append calculated metrics for each modified file in the commit
                     metrics = {
                         "commit hash": commit.hash,
@@ -124,6 +113,7 @@ def calculate_metrics(repo_path, commit_sha):
                         "ComRead": ComRead,
                         "ND": ND,
                         "NS": NS,
+                        "NDEV": NDEV,
                         "AGE": AGE,
                         "FIX": FIX,
                         "NUC": NUC,
@@ -137,31 +127,104 @@ def calculate_metrics(repo_path, commit_sha):
     return metrics_data
 
 
-# Process each repository
-with open(repo_list_file, "r") as file:
-    repo_urls = [line.strip() for line in file if line.strip()]
-
-for repo_url in repo_urls:
-    repo_name = repo_url.split("/")[-1].replace(".git", "")
-    repo_path = os.path.join(clone_dir, repo_name)
+# Compute the metrics of every refactoring commit of a repository and save them to JSON file
+def compute_repository_metrics(repo_name, repo_path, cache):
     output_file = os.path.join(output_dir, f"{repo_name}_refactorings.json")
     metrics_file = os.path.join(output_dir, f"{repo_name}_metrics.json")
 
-    try:
-        with open(output_file, "r", encoding="utf-8") as json_file:
-            refactoring_data = json.load(json_file)
-            metrics_results = []
-
-            for refactoring in refactoring_data.get("commits", []):
-                commit_sha = refactoring.get("sha1")
-                if commit_sha:
-                    metrics = calculate_metrics(repo_path, commit_sha)
-                    metrics_results.extend(metrics)
-
-            with open(metrics_file, "w", encoding='utf-8') as metrics_file_out:
-                json.dump(metrics_results, metrics_file_out, indent=4)
-
-    except Exception as e:
-        print(f"Error processing {repo_name}: {e}")
-
-print("Metrics data has been saved.")
+    metrics_results = []
+
+    # Walk the repository history once and reuse it for every refactoring commit.
+    # The index is kept in the cache, so only commits added since the last run are walked.
+    head, last_head = check_repo_state(cache, repo_name, repo_path, "history")
+    history_index = load_history_index(cache, repo_name)
+
+    # The process metrics of a commit depend on the whole history before it (NUC, AGE, EXP... count
+    # from the first change of each file) but not on later commits, so with a commit window the
+    # history is only walked up to the tips of the window instead of HEAD
+    window = window_commits(repo_path)
+    tips = [head] if window is None else window_tips(repo_path, window) if window else []
+    new_commits = []
+    for tip in tips:
+        if tip != last_head:
+            new_commits += [commit_sha for commit_sha in get_new_commits(repo_path, last_head, tip)
+                            if commit_sha not in history_index["commits"] and commit_sha not in new_commits]
+
+    if new_commits:
+        # The walk diffs every file of every new commit; fetch the blobs missing from a partial clone at once
+        with stage("blob prefetch"):
+            fetched = prefetch_blobs(repo_path, pathspec=None, commit_shas=new_commits)
+        add_counts("blob prefetch", files=fetched)
+
+        with stage("history index"):
+            known_commits = history_index["total_commits"]
+            history_index = build_history_index(repo_path, history_index, only_commits=new_commits)
+            store_history(cache, repo_name, history_index, from_position=known_commits)
+        add_counts("history index", commits=len(new_commits))
+
+    # The walked history ends at the newest tip, unless an earlier run went further
+    if tips and (last_head is None or subprocess.run(
+            ["git", "-C", repo_path, "merge-base", "--is-ancestor", last_head, tips[0]]).returncode == 0):
+        set_last_head(cache, repo_name, "history", tips[0])
+
+    # Only the refactoring commits selected by the commit scope (date range, commit range, sample) are measured
+    # The sidecar index lists the commits without loading the (possibly very large) refactorings file
+    commit_shas = [entry["sha1"] for entry in load_index(output_file) if entry["sha1"]]
+    commit_shas = select_commits(repo_path, commit_shas)
+
+    with ParseCache() as parse_cache:
+        # Inheritance and coupling metrics of all commits that are not cached yet, in one walk
+        # over the commits that keeps a type index up to date with the .java blobs they change
+        new_commit_shas = [commit_sha for commit_sha in commit_shas
+                           if load_metrics(cache, repo_name, commit_sha) is None]
+        with stage("type index"):
+            type_metrics = compute_type_metrics(repo_path, new_commit_shas, parse_cache)
+        add_counts("type index", commits=len(new_commit_shas))
+
+        # Process metrics of every file changed by these commits, in one vectorized pass over the history
+        with stage("process metrics"):
+            process_metrics = compute_process_metrics(history_index, new_commit_shas)
+        add_counts("process metrics", commits=len(new_commit_shas), files=len(process_metrics))
+
+        for commit_sha in commit_shas:
+            # Metrics only depend on the history up to the commit, so cached values stay valid
+            metrics = load_metrics(cache, repo_name, commit_sha)
+            if metrics is None:
+                with stage("calculate metrics", commit=commit_sha):
+                    metrics = calculate_metrics(repo_path, commit_sha, history_index, parse_cache, type_metrics,
+                                                process_metrics)
+                    store_metrics(cache, repo_name, commit_sha, metrics)
+                add_counts("calculate metrics", commits=1, files=len(metrics))
+            metrics_results.extend(metrics)
+
+    with stage("metrics output"):
+        with open(metrics_file, "w", encoding='utf-8') as metrics_file_out:
+            json.dump(metrics_results, metrics_file_out, indent=4)
+
+        # Save the metrics as the repository's partition of the columnar metrics dataset
+        commit_dates = {commit_sha: commit["date"] for commit_sha, commit in history_index["commits"].items()}
+        write_repo_metrics(repo_name, metrics_results, commit_dates)
+
+
+if __name__ == "__main__":
+    # Cache of the history index and of already measured commits, so re-runs only handle new commits
+    cache = open_cache()
+
+    # Process each repository
+    with open(repo_list_file, "r") as file:
+        repo_urls = [line.strip() for line in file if line.strip()]
+
+    for repo_url in repo_urls:
+        repo_name = repo_url.split("/")[-1].replace(".git", "")
+        repo_path = os.path.join(clone_dir, repo_name)
+
+        # Time every stage of the repository, saved to rminer-outputs/profiles/<repo>.part3.json
+        start_profiling(repo_name, "part3")
+        try:
+            compute_repository_metrics(repo_name, repo_path, cache)
+        except Exception as e:
+            print(f"Error processing {repo_name}: {e}")
+        finally:
+            stop_profiling()
+
+    print("Metrics data has been saved.")
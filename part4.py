@@ -1,76 +1,48 @@
 import os
-import json
-import matplotlib.pyplot as plt
-import seaborn as sns
-import pandas as pd
+import sys
+from plot_engine import make_jobs, render_all
+from metrics_store import repo_partition_path
 
 # Define output directory for visualizations
 visualizations_dir = "visualizations"
 os.makedirs(visualizations_dir, exist_ok=True)
 
-# Define the metrics to plot
-metrics_to_plot = [
-    'SEXP', 'CBO', 'WMC', 'RFC', 'ELOC', 'NOM', 'NOPM', 'DIT', 'NOC', 'NOF', 'NOSF',
-    'NOPF', 'NOSM', 'NOSI', 'HsLCOM', 'C3', 'ComRead', 'ND', 'NS', 'AGE', 'FIX', 'NUC',
-    'CEXP', 'REXP', 'OEXP', 'EXP'
-]
+# Number of worker processes used to render the plots, and whether to also draw
+# all metrics of a repository in one image (small multiples)
+plot_workers = os.cpu_count()
+plot_overview = "--overview" in sys.argv
 
-def plot_metrics_evolution(metrics_file, repo_name):
-    # Load metrics data
-    with open(metrics_file, "r", encoding='utf-8') as file:
-        metrics_data = json.load(file)
 
-    # Convert metrics data to DataFrame for easier manipulation
-    df = pd.DataFrame(metrics_data)
+if __name__ == "__main__":
+    # Iterate through repositories and collect the ones with metrics to visualize
+    with open("project_links4.txt", "r") as file:
+        repo_urls = [line.strip() for line in file if line.strip()]
 
-    # Ensure 'commit hash' is a string for better plotting
-    df['commit hash'] = df['commit hash'].astype(str)
+    repositories = []
+    for repo_url in repo_urls:
+        repo_name = repo_url.split("/")[-1].replace(".git", "")
+        # Prefer the columnar metrics dataset, fall back to the JSON file of older runs
+        metrics_file = repo_partition_path(repo_name)
+        if not os.path.exists(metrics_file):
+            metrics_file = os.path.join("rminer-outputs", f"{repo_name}_metrics.json")
 
-    # Sort data by the order of commits, if not already ordered (commits are usually ordered in time)
-    df.sort_values(by='commit hash', ascending=True, inplace=True)
-
-    # Remove rows with NaN values in relevant columns
-    df.dropna(subset=['commit hash'] + metrics_to_plot, inplace=True)
-
-    # Create a folder for each repository under the visualizations directory
-    repo_visualizations_dir = os.path.join(visualizations_dir, repo_name)
-    os.makedirs(repo_visualizations_dir, exist_ok=True)
-
-    # Plot for each metric
-    for metric in metrics_to_plot:
-        plt.figure(figsize=(10, 6))
-
-        # Plot the metric's evolution over the commit order (index-based)
-        sns.lineplot(data=df, x=df.index, y=metric, marker='o', label=metric)
-
-        # Customize the plot
-        plt.title(f"Evolution of {metric} for {repo_name}")
-        plt.xlabel('Commit Order')
-        plt.ylabel(f'{metric} Value')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-
-        # Save the plot as an image in the repository's folder
-        plot_filename = os.path.join(repo_visualizations_dir, f"{repo_name}_{metric}_evolution.png")
-        plt.savefig(plot_filename)
-        plt.close()
-
-    print(f"Visualizations for {repo_name} saved to {repo_visualizations_dir}")
-
-# Iterate through repositories and generate visualizations
-with open("project_links4.txt", "r") as file:
-    repo_urls = [line.strip() for line in file if line.strip()]
-
-for repo_url in repo_urls:
-    repo_name = repo_url.split("/")[-1].replace(".git", "")
-    metrics_file = os.path.join("rminer-outputs", f"{repo_name}_metrics.json")
-
-    try:
         if os.path.exists(metrics_file):
-            plot_metrics_evolution(metrics_file, repo_name)
+            # Create a folder for each repository under the visualizations directory
+            repo_visualizations_dir = os.path.join(visualizations_dir, repo_name)
+            repositories.append((repo_name, metrics_file, repo_visualizations_dir))
         else:
             print(f"Metrics file for {repo_name} not found.")
-    except Exception as e:
-        print(f"Error processing {repo_name}: {e}")
 
-print("Visualization process completed.")
+    # Render the plots of all repositories in parallel
+    jobs = make_jobs(repositories)
+    if plot_overview:
+        jobs += make_jobs(repositories, overview=True)
+    errors = render_all(jobs, workers=plot_workers)
+
+    for repo_name, metrics_file, repo_visualizations_dir in repositories:
+        if repo_name in errors:
+            print(f"Error processing {repo_name}: {errors[repo_name]}")
+        else:
+            print(f"Visualizations for {repo_name} saved to {repo_visualizations_dir}")
+
+    print("Visualization process completed.")
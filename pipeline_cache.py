@@ -0,0 +1,254 @@
+import os
+import json
+import sqlite3
+import subprocess
+from datetime import datetime
+from history_index import new_history_index, add_commit_entry
+
+# Persistent cache shared by the mining (part2) and metrics (part3) steps
+output_dir = "rminer-outputs"
+cache_file = os.path.join(output_dir, "pipeline_cache.sqlite")
+
+schema = """
+CREATE TABLE IF NOT EXISTS repo_state (
+    repo TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    head_sha TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (repo, stage)
+);
+CREATE TABLE IF NOT EXISTS refactorings (
+    repo TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (repo, sha)
+);
+CREATE TABLE IF NOT EXISTS commit_messages (
+    repo TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    message TEXT NOT NULL,
+    previous_sha TEXT,
+    PRIMARY KEY (repo, sha)
+);
+CREATE TABLE IF NOT EXISTS diffs (
+    repo TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    additions INTEGER NOT NULL,
+    deletions INTEGER NOT NULL,
+    diff_key TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS diffs_commit ON diffs (repo, sha);
+CREATE TABLE IF NOT EXISTS diff_bodies (
+    diff_key TEXT PRIMARY KEY,
+    content TEXT
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    repo TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (repo, sha)
+);
+CREATE TABLE IF NOT EXISTS history (
+    repo TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    sha TEXT NOT NULL,
+    author TEXT NOT NULL,
+    date TEXT NOT NULL,
+    file_changes TEXT NOT NULL,
+    PRIMARY KEY (repo, position)
+);
+"""
+
+# Version of the schema above; tables of older versions are dropped and filled again by the next run
+schema_version = 4
+outdated_tables = {
+    1: ["diffs", "commit_messages"],  # Diff bodies moved to diff_bodies, deduplicated by diff key
+    2: ["metrics"],  # AGE is the average age in fractional days, EXP is computed in log space
+    3: ["metrics"],  # NDEV (number of developers of the file) was added
+    4: ["diffs", "diff_bodies", "commit_messages"]  # Diff keys are the blob ids read from git
+}
+
+# Tables holding per-commit data of a repository (repo_state is handled separately)
+repo_tables = ["refactorings", "commit_messages", "diffs", "metrics", "history"]
+
+
+def open_cache(path=cache_file):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    # Several pipeline workers may write to the cache at the same time
+    conn = sqlite3.connect(path, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for newer_version, tables in outdated_tables.items():
+        if version < newer_version:
+            for table in tables:
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+    conn.executescript(schema)
+    conn.execute(f"PRAGMA user_version = {schema_version}")
+    return conn
+
+
+def get_head(repo_path):
+    result = subprocess.run(["git", "-C", repo_path, "rev-parse", "HEAD"], capture_output=True, text=True,
+                            encoding='utf-8')
+    if result.returncode != 0:
+        print(f"Error reading HEAD of {repo_path}: {result.stderr}")
+        return None
+    return result.stdout.strip()
+
+
+def get_last_head(conn, repo_name, stage):
+    row = conn.execute("SELECT head_sha FROM repo_state WHERE repo = ? AND stage = ?", (repo_name, stage)).fetchone()
+    return row[0] if row else None
+
+
+def set_last_head(conn, repo_name, stage, head_sha):
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO repo_state (repo, stage, head_sha, updated_at) VALUES (?, ?, ?, ?)",
+                     (repo_name, stage, head_sha, datetime.now().isoformat()))
+
+
+def clear_repo(conn, repo_name):
+    with conn:
+        for table in repo_tables + ["repo_state"]:
+            conn.execute(f"DELETE FROM {table} WHERE repo = ?", (repo_name,))
+
+
+# Work out what a stage has to do for a repository since its last run.
+# Returns (head, last_head); last_head is None when the repository has to be processed
+# from scratch (never seen, or its history was rewritten and the cache was dropped).
+def check_repo_state(conn, repo_name, repo_path, stage):
+    head = get_head(repo_path)
+    last_head = get_last_head(conn, repo_name, stage)
+
+    if last_head and last_head != head:
+        is_ancestor = subprocess.run(["git", "-C", repo_path, "merge-base", "--is-ancestor", last_head, head],
+                                     capture_output=True)
+        if is_ancestor.returncode != 0:
+            print(f"History of {repo_name} was rewritten since {last_head}, dropping its cached data")
+            clear_repo(conn, repo_name)
+            last_head = None
+
+    return head, last_head
+
+
+# Commits reachable from head but not from last_head, oldest first
+def get_new_commits(repo_path, last_head, head):
+    rev_range = f"{last_head}..{head}" if last_head else head
+    result = subprocess.run(["git", "-C", repo_path, "rev-list", "--reverse", rev_range], capture_output=True,
+                            text=True, encoding='utf-8')
+    if result.returncode != 0:
+        print(f"Error listing commits {rev_range} of {repo_path}: {result.stderr}")
+        return []
+    return result.stdout.split()
+
+
+def store_refactorings(conn, repo_name, commits):
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO refactorings (repo, sha, data) VALUES (?, ?, ?)",
+                         [(repo_name, c["sha1"], json.dumps(c)) for c in commits if c.get("sha1")])
+
+
+def load_refactorings(conn, repo_name):
+    return list(iter_refactorings(conn, repo_name))
+
+
+# Iterate the cached refactoring commits of a repository one at a time (only the given shas if set)
+def iter_refactorings(conn, repo_name, shas=None):
+    shas = set(shas) if shas is not None else None
+    rows = conn.execute("SELECT sha, data FROM refactorings WHERE repo = ? ORDER BY rowid", (repo_name,))
+    for sha, data in rows:
+        if shas is None or sha in shas:
+            yield json.loads(data)
+
+
+def load_refactoring_shas(conn, repo_name):
+    rows = conn.execute("SELECT sha FROM refactorings WHERE repo = ? ORDER BY rowid", (repo_name,))
+    return [sha for (sha,) in rows]
+
+
+def has_commit_data(conn, repo_name, commit_sha):
+    row = conn.execute("SELECT 1 FROM commit_messages WHERE repo = ? AND sha = ?", (repo_name, commit_sha)).fetchone()
+    return row is not None
+
+
+# Store the message and file diffs of a commit together, so a cached message means the diffs are cached too.
+# Diff bodies are stored once per diff key.
+def store_commit_data(conn, repo_name, commit_sha, commit_message, previous_commit_hash, diffs):
+    with conn:
+        conn.execute("DELETE FROM diffs WHERE repo = ? AND sha = ?", (repo_name, commit_sha))
+        conn.executemany("INSERT OR IGNORE INTO diff_bodies (diff_key, content) VALUES (?, ?)",
+                         [(d["diff key"], d["diff content"]) for d in diffs])
+        conn.executemany(
+            "INSERT INTO diffs (repo, sha, file_path, additions, deletions, diff_key) VALUES (?, ?, ?, ?, ?, ?)",
+            [(repo_name, commit_sha, d["diff stats"]["file_path"], d["diff stats"]["additions"],
+              d["diff stats"]["deletions"], d["diff key"]) for d in diffs])
+        conn.execute("INSERT OR REPLACE INTO commit_messages (repo, sha, message, previous_sha) VALUES (?, ?, ?, ?)",
+                     (repo_name, commit_sha, commit_message, previous_commit_hash))
+
+
+def load_commit_messages(conn, repo_name):
+    rows = conn.execute("SELECT sha, message FROM commit_messages WHERE repo = ? ORDER BY rowid", (repo_name,))
+    return [{"commit hash": sha, "commit message": message} for sha, message in rows]
+
+
+# Iterate the cached file diffs of a repository one row at a time
+def iter_diffs(conn, repo_name):
+    rows = conn.execute(
+        "SELECT d.sha, m.previous_sha, d.file_path, d.additions, d.deletions, d.diff_key, b.content FROM diffs d "
+        "JOIN commit_messages m ON m.repo = d.repo AND m.sha = d.sha "
+        "LEFT JOIN diff_bodies b ON b.diff_key = d.diff_key WHERE d.repo = ? ORDER BY m.rowid, d.rowid",
+        (repo_name,))
+    for sha, previous_sha, file_path, additions, deletions, key, content in rows:
+        yield {
+            "commit hash": sha,
+            "previous commit hash": previous_sha,
+            "diff stats": {
+                "file_path": file_path,
+                "additions": additions,
+                "deletions": deletions
+            },
+            "diff key": key,
+            "diff content": content
+        }
+
+
+def store_metrics(conn, repo_name, commit_sha, metrics):
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO metrics (repo, sha, data) VALUES (?, ?, ?)",
+                     (repo_name, commit_sha, json.dumps(metrics)))
+
+
+# Cached per-file metrics of a commit, or None when the commit was never measured
+def load_metrics(conn, repo_name, commit_sha):
+    row = conn.execute("SELECT data FROM metrics WHERE repo = ? AND sha = ?", (repo_name, commit_sha)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+# Persist the commits of the history index from the given position on
+def store_history(conn, repo_name, history_index, from_position=0):
+    commit_changes = {}
+    for file_path, file_commits in history_index["files"].items():
+        for c in file_commits:
+            if c["position"] >= from_position:
+                commit_changes.setdefault(c["commit hash"], []).append([file_path, c["added"], c["removed"]])
+
+    rows = [(repo_name, c["position"], sha, c["author"], c["date"].isoformat(), json.dumps(commit_changes.get(sha, [])))
+            for sha, c in history_index["commits"].items() if c["position"] >= from_position]
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO history (repo, position, sha, author, date, file_changes) VALUES (?, ?, ?, ?, ?, ?)",
+            rows)
+
+
+def load_history_index(conn, repo_name):
+    history_index = new_history_index()
+    rows = conn.execute("SELECT sha, author, date, file_changes FROM history WHERE repo = ? ORDER BY position",
+                        (repo_name,))
+    for sha, author, date, file_changes in rows:
+        add_commit_entry(history_index, sha, author, datetime.fromisoformat(date),
+                         [tuple(change) for change in json.loads(file_changes)])
+    return history_index
@@ -0,0 +1,153 @@
+import os
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+
+matplotlib.use("Agg")  # Headless backend, no display needed on the workers
+
+import matplotlib.pyplot as plt
+import seaborn as sns
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Define the metrics to plot
+metrics_to_plot = [
+    'SEXP', 'CBO', 'WMC', 'RFC', 'ELOC', 'NOM', 'NOPM', 'DIT', 'NOC', 'NOF', 'NOSF',
+    'NOPF', 'NOSM', 'NOSI', 'HsLCOM', 'C3', 'ComRead', 'ND', 'NS', 'AGE', 'FIX', 'NUC',
+    'CEXP', 'REXP', 'OEXP', 'EXP'
+]
+
+# Figures are created once per worker process and reused for every plot it renders
+_single_figure = None
+_overview_figure = None
+
+
+# Load the metrics of a repository, from its Parquet partition (only the plotted columns are read,
+# memory mapped) or from the older <repo>_metrics.json file
+def load_metrics_frame(metrics_file, metrics=metrics_to_plot):
+    if metrics_file.endswith(".parquet"):
+        df = pq.read_table(metrics_file, columns=['commit hash'] + list(metrics), memory_map=True).to_pandas()
+    else:
+        # Load metrics data
+        with open(metrics_file, "r", encoding='utf-8') as file:
+            metrics_data = json.load(file)
+
+        # Convert metrics data to DataFrame for easier manipulation
+        df = pd.DataFrame(metrics_data)
+
+    # Ensure 'commit hash' is a string for better plotting
+    df['commit hash'] = df['commit hash'].astype(str)
+
+    # Sort data by the order of commits, if not already ordered (commits are usually ordered in time)
+    df.sort_values(by='commit hash', ascending=True, inplace=True)
+
+    # Remove rows with NaN values in relevant columns
+    df.dropna(subset=['commit hash'] + list(metrics), inplace=True)
+    return df
+
+
+def get_single_figure():
+    global _single_figure
+    if _single_figure is None:
+        _single_figure = plt.figure(figsize=(10, 6))
+        _single_figure.add_subplot(1, 1, 1)
+    return _single_figure
+
+
+def get_overview_figure(metric_count):
+    global _overview_figure
+    columns = 4
+    rows = math.ceil(metric_count / columns)
+    if _overview_figure is None or len(_overview_figure.axes) != rows * columns:
+        if _overview_figure is not None:
+            plt.close(_overview_figure)
+        _overview_figure, _ = plt.subplots(rows, columns, figsize=(columns * 5, rows * 3))
+    return _overview_figure
+
+
+def draw_metric(ax, df, metric, title):
+    ax.clear()
+
+    # Plot the metric's evolution over the commit order (index-based)
+    sns.lineplot(data=df, x=df.index, y=metric, marker='o', label=metric, ax=ax)
+
+    # Customize the plot
+    ax.set_title(title)
+    ax.set_xlabel('Commit Order')
+    ax.set_ylabel(f'{metric} Value')
+    ax.tick_params(axis='x', labelrotation=45)
+
+
+# One image per metric, drawn on the reused figure of this process
+def render_metric_plots(df, repo_name, output_dir, metrics):
+    figure = get_single_figure()
+    ax = figure.axes[0]
+    for metric in metrics:
+        draw_metric(ax, df, metric, f"Evolution of {metric} for {repo_name}")
+        figure.tight_layout()
+
+        # Save the plot as an image in the output folder
+        plot_filename = os.path.join(output_dir, f"{repo_name}_{metric}_evolution.png")
+        figure.savefig(plot_filename)
+
+
+# Small multiples: all metrics of a repository in one image
+def render_overview(df, repo_name, output_dir, metrics):
+    figure = get_overview_figure(len(metrics))
+    for ax in figure.axes:
+        ax.clear()
+        ax.set_visible(False)
+
+    for ax, metric in zip(figure.axes, metrics):
+        ax.set_visible(True)
+        draw_metric(ax, df, metric, metric)
+        ax.legend().remove()
+
+    figure.suptitle(f"Evolution of the metrics for {repo_name}")
+    figure.tight_layout()
+    plot_filename = os.path.join(output_dir, f"{repo_name}_metrics_overview.png")
+    figure.savefig(plot_filename)
+
+
+# Render the plots of one job; errors are returned so one repository cannot stop the others
+def render_job(job):
+    try:
+        os.makedirs(job["output dir"], exist_ok=True)
+        df = load_metrics_frame(job["metrics file"], job["metrics"])
+        if job.get("overview"):
+            render_overview(df, job["repo"], job["output dir"], job["metrics"])
+        else:
+            render_metric_plots(df, job["repo"], job["output dir"], job["metrics"])
+    except Exception as e:
+        return job["repo"], f"{type(e).__name__}: {e}"
+    return job["repo"], None
+
+
+# Split the repositories into rendering jobs. Each job renders metrics_per_job metrics of one
+# repository, or all metrics in one image when overview (small multiples) is set.
+def make_jobs(repositories, overview=False, metrics_per_job=len(metrics_to_plot), metrics=metrics_to_plot):
+    jobs = []
+    for repo_name, metrics_file, output_dir in repositories:
+        if overview:
+            jobs.append({"repo": repo_name, "metrics file": metrics_file, "output dir": output_dir,
+                         "metrics": list(metrics), "overview": True})
+            continue
+
+        for start in range(0, len(metrics), metrics_per_job):
+            jobs.append({"repo": repo_name, "metrics file": metrics_file, "output dir": output_dir,
+                         "metrics": list(metrics[start:start + metrics_per_job])})
+    return jobs
+
+
+# Render all jobs on a pool of worker processes (in this process when workers is 1).
+# Returns {repo name: error message} for the repositories that failed.
+def render_all(jobs, workers=None):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        results = [render_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(render_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+    return {repo_name: error for repo_name, error in results if error}
@@ -0,0 +1,275 @@
+import os
+import sys
+import json
+import glob
+import time
+import subprocess
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+# Folder with one profile per repository and pipeline step, and the merged report
+output_dir = "rminer-outputs"
+profiles_dir = os.path.join(output_dir, "profiles")
+report_file = os.path.join(output_dir, "performance_report")
+
+# Number of slowest commits kept per stage
+slowest_commits_kept = 5
+
+# Subprocesses started by this process (git, RefactoringMiner, GitPython calls...)
+subprocess_count = 0
+_original_popen_init = subprocess.Popen.__init__
+
+
+def _counting_popen_init(self, *args, **kwargs):
+    global subprocess_count
+    subprocess_count += 1
+    _original_popen_init(self, *args, **kwargs)
+
+
+def install_subprocess_counter():
+    subprocess.Popen.__init__ = _counting_popen_init
+
+
+# Largest memory high-water mark (kB) of this process seen before it was reset by a stage
+_process_peak_kb = 0
+
+
+# A field in kB of /proc/self/status (VmRSS: current, VmHWM: high-water mark), None where it is not available
+def read_status_kb(field):
+    try:
+        with open("/proc/self/status", "r") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+# Reset the high-water mark of this process to its current resident memory (Linux only), so the
+# peak of a stage can be read at its end. Returns False where the mark cannot be reset.
+def reset_rss_high_water():
+    global _process_peak_kb
+    high_water = read_status_kb("VmHWM")
+    if high_water is None:
+        return False
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        return False
+    _process_peak_kb = max(_process_peak_kb, high_water)
+    return True
+
+
+# Process-wide peak resident memory (MB) of this process since it started, and of its finished
+# child processes. Not a per-stage figure: it only ever grows over the life of the process.
+def get_peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            memory = psutil.Process().memory_info()
+            return getattr(memory, "peak_wset", memory.rss) / (1024 * 1024), None
+        except ImportError:
+            return None, None
+
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere. On Linux it follows the high-water
+    # mark, which the stages reset, so the peaks seen before the resets are added back.
+    unit = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit, _process_peak_kb / 1024)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit
+    return own, children
+
+
+def get_cpu_seconds():
+    times = os.times()
+    return times.user + times.system, times.children_user + times.children_system
+
+
+def new_stage_stats():
+    return {
+        "calls": 0,
+        "wall seconds": 0.0,
+        "cpu seconds": 0.0,
+        "child cpu seconds": 0.0,
+        "max wall seconds": 0.0,
+        "subprocesses": 0,
+        "commits": 0,
+        "files": 0,
+        "peak rss mb": None,
+        "rss delta mb": None,
+        "process peak rss mb": None,
+        "process child peak rss mb": None,
+        "slowest commits": []
+    }
+
+
+# Times and counts the stages of the pipeline for one repository. Stages can be nested,
+# and the time of a stage includes the stages run inside it.
+# Memory of a stage: "peak rss mb" is the highest resident memory of the process while the stage
+# ran (Linux only), "rss delta mb" the resident memory it added; "process peak rss mb" is the
+# process-wide peak at its end, which includes everything the process did before.
+class Profiler:
+    def __init__(self, repo_name, step):
+        self.repo_name = repo_name
+        self.step = step
+        self.started = datetime.now()
+        self.stages = {}
+        # Peak (kB) of every running stage up to the last reset of the high-water mark
+        self.open_peaks = []
+        install_subprocess_counter()
+
+    @contextmanager
+    def stage(self, name, commit=None):
+        start_wall = time.perf_counter()
+        start_cpu, start_child_cpu = get_cpu_seconds()
+        start_subprocesses = subprocess_count
+        start_rss = read_status_kb("VmRSS")
+
+        # Resetting the high-water mark also resets it for the stages this one runs in,
+        # so their peak so far is kept first
+        high_water = read_status_kb("VmHWM")
+        for open_peak in self.open_peaks:
+            open_peak[0] = max(open_peak[0], high_water or 0)
+        measure_peak = reset_rss_high_water()
+        open_peak = [0]
+        self.open_peaks.append(open_peak)
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu, child_cpu = get_cpu_seconds()
+            self.open_peaks = [peak for peak in self.open_peaks if peak is not open_peak]
+            end_rss = read_status_kb("VmRSS")
+            peak_rss = max(open_peak[0], read_status_kb("VmHWM") or 0) / 1024 if measure_peak else None
+            process_peak_rss, child_peak_rss = get_peak_rss_mb()
+
+            stats = self.stages.setdefault(name, new_stage_stats())
+            stats["calls"] += 1
+            stats["wall seconds"] += wall
+            stats["cpu seconds"] += cpu - start_cpu
+            stats["child cpu seconds"] += child_cpu - start_child_cpu
+            stats["max wall seconds"] = max(stats["max wall seconds"], wall)
+            stats["subprocesses"] += subprocess_count - start_subprocesses
+            if peak_rss is not None:
+                stats["peak rss mb"] = max(stats["peak rss mb"] or 0, peak_rss)
+            if start_rss is not None and end_rss is not None:
+                stats["rss delta mb"] = (stats["rss delta mb"] or 0) + (end_rss - start_rss) / 1024
+            stats["process peak rss mb"] = process_peak_rss
+            stats["process child peak rss mb"] = child_peak_rss
+
+            if commit is not None:
+                stats["slowest commits"].append([commit, wall])
+                stats["slowest commits"].sort(key=lambda item: item[1], reverse=True)
+                del stats["slowest commits"][slowest_commits_kept:]
+
+    def add_counts(self, name, commits=0, files=0):
+        stats = self.stages.setdefault(name, new_stage_stats())
+        stats["commits"] += commits
+        stats["files"] += files
+
+    def to_dict(self):
+        return {
+            "repo": self.repo_name,
+            "step": self.step,
+            "started": self.started.isoformat(),
+            "stages": self.stages
+        }
+
+    def save(self, folder=profiles_dir):
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{self.repo_name}.{self.step}.json")
+        with open(path, "w", encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=4)
+        return path
+
+
+# The profiler of the repository currently processed by this process, if profiling is on.
+# Code deep in the pipeline uses stage() and add_counts() without having to pass it around.
+_active_profiler = None
+
+
+def start_profiling(repo_name, step):
+    global _active_profiler
+    _active_profiler = Profiler(repo_name, step)
+    return _active_profiler
+
+
+def stop_profiling(folder=profiles_dir):
+    global _active_profiler
+    profiler, _active_profiler = _active_profiler, None
+    if profiler is not None:
+        profiler.save(folder)
+    return profiler
+
+
+def stage(name, commit=None):
+    if _active_profiler is None:
+        return nullcontext()
+    return _active_profiler.stage(name, commit)
+
+
+def add_counts(name, commits=0, files=0):
+    if _active_profiler is not None:
+        _active_profiler.add_counts(name, commits, files)
+
+
+# Merge all saved profiles into one report: per repository stages, and the stages ranked
+# by their total wall time across all repositories
+def build_report(folder=profiles_dir):
+    repositories = {}
+    totals = {}
+    for path in sorted(glob.glob(os.path.join(folder, "*.json"))):
+        with open(path, "r", encoding='utf-8') as file:
+            profile = json.load(file)
+
+        repo_stages = repositories.setdefault(profile["repo"], {})
+        for name, stats in profile["stages"].items():
+            repo_stages[f"{profile['step']}: {name}"] = stats
+            total = totals.setdefault(name, {"repos": 0, "calls": 0, "wall seconds": 0.0, "cpu seconds": 0.0,
+                                             "subprocesses": 0, "commits": 0, "files": 0, "slowest repo": None,
+                                             "slowest repo seconds": 0.0, "peak rss mb": None,
+                                             "peak rss repo": None})
+            total["repos"] += 1
+            for key in ("calls", "wall seconds", "cpu seconds", "subprocesses", "commits", "files"):
+                total[key] += stats[key]
+            if stats["wall seconds"] > total["slowest repo seconds"]:
+                total["slowest repo"] = profile["repo"]
+                total["slowest repo seconds"] = stats["wall seconds"]
+            if stats.get("peak rss mb") is not None and stats["peak rss mb"] > (total["peak rss mb"] or 0):
+                total["peak rss mb"] = stats["peak rss mb"]
+                total["peak rss repo"] = profile["repo"]
+
+    ranking = sorted(totals.items(), key=lambda item: item[1]["wall seconds"], reverse=True)
+    return {
+        "generated": datetime.now().isoformat(),
+        "stages": [dict(stats, stage=name) for name, stats in ranking],
+        "repositories": repositories
+    }
+
+
+def format_table(report):
+    lines = [f"{'stage':<24} {'repos':>5} {'calls':>8} {'wall s':>10} {'cpu s':>10} {'subproc':>8} "
+             f"{'commits':>8} {'files':>8} {'commits/s':>9} {'peak MB':>8}  slowest repo"]
+    for stats in report["stages"]:
+        rate = stats["commits"] / stats["wall seconds"] if stats["commits"] and stats["wall seconds"] else 0
+        lines.append(f"{stats['stage']:<24} {stats['repos']:>5} {stats['calls']:>8} {stats['wall seconds']:>10.1f} "
+                     f"{stats['cpu seconds']:>10.1f} {stats['subprocesses']:>8} {stats['commits']:>8} "
+                     f"{stats['files']:>8} {rate:>9.1f} {stats['peak rss mb'] or 0:>8.0f}  {stats['slowest repo']} "
+                     f"({stats['slowest repo seconds']:.1f}s)")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Merge the profiles of all runs into rminer-outputs/performance_report.json and .txt
+    performance_report = build_report()
+    table = format_table(performance_report)
+
+    with open(report_file + ".json", "w", encoding='utf-8') as report_out:
+        json.dump(performance_report, report_out, indent=4)
+    with open(report_file + ".txt", "w", encoding='utf-8') as table_out:
+        table_out.write(table + "\n")
+
+    print(table)
@@ -0,0 +1,95 @@
+import os
+import json
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+# Miners find the refactorings of the commits reachable from end but not from start (like
+# git start..end) and return them as the "commits" list of RefactoringMiner's JSON output.
+# Any object with this mine() method can be used by part2, e.g. FakeMiner to run without Java.
+class RefactoringMinerCli:
+    def __init__(self, jar_path, java_options=()):
+        self.jar_path = jar_path
+        self.java_options = list(java_options)
+
+    def mine(self, repo_path, start, end, output_file):
+        command = (["java"] + self.java_options
+                   + ["-jar", self.jar_path, "-bc", repo_path, start, end, "-json", output_file])
+        result = subprocess.run(command)
+        if not os.path.exists(output_file):
+            raise RuntimeError(f"RefactoringMiner exited with code {result.returncode} on {start}..{end}")
+
+        # Load refactoring data
+        with open(output_file, "r", encoding="utf-8") as json_file:
+            refactoring_data = json.load(json_file)
+        os.remove(output_file)
+        return refactoring_data.get("commits", [])
+
+
+# Miner that reports one made-up refactoring for every commit with a parent, read with git only.
+# Lets the range splitting, scheduling and caching be checked without Java.
+class FakeMiner:
+    def __init__(self, refactoring_type="Rename Method"):
+        self.refactoring_type = refactoring_type
+        self.calls = []
+
+    def mine(self, repo_path, start, end, output_file):
+        self.calls.append((start, end))
+        result = subprocess.run(["git", "-C", repo_path, "rev-list", "--no-merges", "--min-parents=1", "--reverse",
+                                 f"{start}..{end}"], capture_output=True, text=True, encoding='utf-8')
+        if result.returncode != 0:
+            raise RuntimeError(f"cannot list commits {start}..{end}: {result.stderr}")
+        return [{
+            "repository": repo_path,
+            "sha1": commit_sha,
+            "url": "",
+            "refactorings": [{"type": self.refactoring_type, "description": f"fake refactoring in {commit_sha}",
+                              "leftSideLocations": [], "rightSideLocations": []}]
+        } for commit_sha in result.stdout.split()]
+
+
+# Split the history between start (excluded, None for the first commit) and end into ranges of about
+# range_size commits, cut along the first-parent chain so every commit falls into exactly one range.
+# Returns [(range start, range end), ...] oldest first. The first commit itself is never in a range,
+# RefactoringMiner does not report commits without a parent.
+def split_commit_ranges(repo_path, start, end, range_size):
+    command = ["git", "-C", repo_path, "rev-list", "--first-parent", "--reverse", end]
+    if start:
+        command.append(f"^{start}")
+    result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8')
+    if result.returncode != 0:
+        raise RuntimeError(f"cannot list commits of {repo_path}: {result.stderr}")
+
+    chain = result.stdout.split()
+    if not start:
+        if not chain:
+            return []
+        start, chain = chain[0], chain[1:]
+
+    ranges = []
+    for i in range(0, len(chain), max(1, range_size)):
+        range_end = chain[min(i + range_size, len(chain)) - 1]
+        ranges.append((start, range_end))
+        start = range_end
+    return ranges
+
+
+# Mine the ranges on `workers` concurrent miners and yield (range index, commits) as each one finishes.
+# A failed range does not stop the others; the failures are raised together once all ranges are done.
+def mine_ranges(miner, repo_path, ranges, workers=1, output_prefix="refactorings"):
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(miner.mine, repo_path, start, end, f"{output_prefix}_range{index}.json"): index
+                   for index, (start, end) in enumerate(ranges)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                commits = future.result()
+            except Exception as e:
+                start, end = ranges[index]
+                errors.append(f"{start}..{end}: {e}")
+                continue
+            yield index, commits
+
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {len(ranges)} commit ranges failed: " + "; ".join(errors))
@@ -0,0 +1,164 @@
+import os
+import re
+import json
+import codecs
+
+# Bytes read from the refactorings file at a time
+read_size = 1 << 20
+
+commits_array_pattern = re.compile(r'"commits"\s*:\s*\[')
+whitespace_pattern = re.compile(r"[\s,]*")
+
+
+# Sidecar index of a <repo>_refactorings.json file: one line per commit with its sha, the byte offset
+# and length of its record in the file and its refactoring types, so a stage can list, filter and
+# seek to commits without parsing the file. The first line holds the size and mtime of the file
+# it was built from, an index that does not match them is built again.
+def index_path(path):
+    return path + ".index.tsv"
+
+
+def refactoring_types(commit):
+    return sorted({refactoring.get("type", "") for refactoring in commit.get("refactorings", [])} - {""})
+
+
+# Yield (byte offset, byte length, commit) for every record of the "commits" array, one record at a
+# time. Memory stays bounded by the largest single record instead of the size of the file.
+def iter_commit_records(path):
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+
+    with open(path, "rb") as file:
+        buffer = ""
+        pos = 0
+        byte_pos = 0  # byte offset in the file of buffer[pos]
+        eof = False
+
+        # Read more of the file, dropping the part of the buffer that was already consumed
+        def fill(size=read_size):
+            nonlocal buffer, pos, eof
+            chunk = file.read(size)
+            eof = not chunk
+            buffer = buffer[pos:] + text_decoder.decode(chunk, final=eof)
+            pos = 0
+
+        def advance(new_pos):
+            nonlocal pos, byte_pos
+            byte_pos += len(buffer[pos:new_pos].encode("utf-8"))
+            pos = new_pos
+
+        # Find the start of the commits array
+        while True:
+            match = commits_array_pattern.search(buffer, pos)
+            if match:
+                advance(match.end())
+                break
+            if eof:
+                return
+            # Keep the end of the buffer, the key may be split between two reads
+            advance(max(pos, len(buffer) - 32))
+            fill()
+
+        while True:
+            advance(whitespace_pattern.match(buffer, pos).end())
+            if pos == len(buffer):
+                if eof:
+                    raise ValueError(f"{path} ends inside the commits array")
+                fill()
+                continue
+            if buffer[pos] == "]":
+                return
+
+            try:
+                commit, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Record cut by the end of the buffer, read at least as much again and retry
+                fill(max(read_size, len(buffer) - pos))
+                continue
+
+            offset = byte_pos
+            advance(end)
+            yield offset, byte_pos - offset, commit
+
+
+# Yield the commits of a refactorings file one at a time
+def iter_refactoring_commits(path):
+    for offset, length, commit in iter_commit_records(path):
+        yield commit
+
+
+def read_commit_at(file, offset, length):
+    file.seek(offset)
+    return json.loads(file.read(length).decode("utf-8"))
+
+
+def write_index(path, entries):
+    stat = os.stat(path)
+    temp_path = index_path(path) + ".tmp"
+    with open(temp_path, "w", encoding='utf-8') as index_file:
+        index_file.write(f"# {stat.st_size} {stat.st_mtime_ns}\n")
+        for entry in entries:
+            index_file.write(f"{entry['sha1']}\t{entry['offset']}\t{entry['length']}\t{','.join(entry['types'])}\n")
+    os.replace(temp_path, index_path(path))
+
+
+# Write the commits (any iterable, e.g. a generator over the cache) as a RefactoringMiner JSON file
+# one record at a time, and its sidecar index along the way
+def write_refactorings(path, commits):
+    entries = []
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(b'{\n"commits": [\n')
+        for i, commit in enumerate(commits):
+            if i:
+                file.write(b",\n")
+            record = json.dumps(commit, indent=4).encode("utf-8")
+            entries.append({"sha1": commit.get("sha1", ""), "offset": file.tell(), "length": len(record),
+                            "types": refactoring_types(commit)})
+            file.write(record)
+        file.write(b"\n]\n}\n")
+    os.replace(temp_path, path)
+    write_index(path, entries)
+    return entries
+
+
+# Build the sidecar index of an existing refactorings file with one streaming pass
+def build_index(path):
+    entries = [{"sha1": commit.get("sha1", ""), "offset": offset, "length": length, "types": refactoring_types(commit)}
+               for offset, length, commit in iter_commit_records(path)]
+    write_index(path, entries)
+    return entries
+
+
+# Entries of the sidecar index ({"sha1", "offset", "length", "types"}), built first if it is missing or stale
+def load_index(path):
+    stat = os.stat(path)
+    try:
+        with open(index_path(path), "r", encoding='utf-8') as index_file:
+            header = index_file.readline().split()
+            if header[1:] == [str(stat.st_size), str(stat.st_mtime_ns)]:
+                entries = []
+                for line in index_file:
+                    sha, offset, length, types = line.rstrip("\n").split("\t")
+                    entries.append({"sha1": sha, "offset": int(offset), "length": int(length),
+                                    "types": types.split(",") if types else []})
+                return entries
+    except (OSError, ValueError):
+        pass
+    return build_index(path)
+
+
+# Yield the commits of a refactorings file, optionally only the given shas or those with at least one
+# of the given refactoring types, reading only their records through the index
+def iter_indexed_commits(path, shas=None, types=None):
+    shas = set(shas) if shas is not None else None
+    types = set(types) if types is not None else None
+    with open(path, "rb") as file:
+        for entry in load_index(path):
+            if shas is not None and entry["sha1"] not in shas:
+                continue
+            if types is not None and not types.intersection(entry["types"]):
+                continue
+            yield read_commit_at(file, entry["offset"], entry["length"])
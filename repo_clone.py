@@ -0,0 +1,136 @@
+import os
+import subprocess
+
+# Clone modes of the clone stage:
+#   "full"     - complete clone with every blob of the history
+#   "blobless" - partial clone (--filter=blob:none): commits and trees only, blobs are fetched when needed
+#   "shallow"  - only the last `depth` commits (the process metrics then only see that part of the history)
+clone_modes = ("full", "blobless", "shallow")
+
+# Lets git send large requests over HTTP, for this command only instead of in the global config
+http_options = ["-c", "http.postBuffer=524288000"]
+
+null_sha = "0" * 40
+
+
+def run_git_command(args, stdin_text=None):
+    result = subprocess.run(["git"] + args, input=stdin_text, capture_output=True, text=True, encoding='utf-8')
+    if result.returncode != 0:
+        raise RuntimeError(f"git {' '.join(args[:3])} failed: {result.stderr.strip()}")
+    return result.stdout
+
+
+def is_git_repository(path):
+    if not os.path.isdir(path):
+        return False
+    result = subprocess.run(["git", "-C", path, "rev-parse", "--git-dir"], capture_output=True)
+    return result.returncode == 0
+
+
+# True for a partial clone, whose missing blobs are fetched from its promisor remote
+def is_partial_clone(repo_path):
+    result = subprocess.run(["git", "-C", repo_path, "config", "--get", "remote.origin.promisor"],
+                            capture_output=True, text=True)
+    return result.stdout.strip() == "true"
+
+
+# Bare repository holding the objects shared by several clones (forks of the same project).
+# Each repository is fetched into its own refs/remotes/<name>/ namespace and the clones borrow
+# the objects through git alternates (--reference) instead of downloading them again.
+def update_reference_store(reference_path, repo_name, repo_url):
+    if not is_git_repository(reference_path):
+        run_git_command(["init", "--bare", "--quiet", reference_path])
+    run_git_command(["--git-dir", reference_path] + http_options
+                    + ["fetch", "--quiet", "--no-tags", repo_url, f"+refs/heads/*:refs/remotes/{repo_name}/*"])
+
+
+# Clone repo_url into repo_path, or fetch the new commits if it was cloned before.
+# The working tree is not checked out by default: the pipeline reads everything from the object
+# database, and checking out a blobless clone would download every blob of the latest commit.
+def clone_repository(repo_url, repo_path, mode="full", depth=1, reference=None, checkout=False):
+    if mode not in clone_modes:
+        raise ValueError(f"unknown clone mode {mode}, expected one of {', '.join(clone_modes)}")
+
+    if is_git_repository(repo_path):
+        update_repository(repo_path, depth if mode == "shallow" else None)
+        return
+
+    command = http_options + ["clone", "--quiet"]
+    if mode == "blobless":
+        command.append("--filter=blob:none")
+    elif mode == "shallow":
+        command += ["--depth", str(depth)]
+    if reference:
+        # Objects already in the reference store are not downloaded again
+        command += ["--reference-if-able", reference]
+    if not checkout:
+        command.append("--no-checkout")
+
+    # Local paths are cloned through the file:// transport, the only one that supports --filter and --depth
+    if os.path.isdir(repo_url):
+        repo_url = "file://" + os.path.abspath(repo_url).replace(os.sep, "/")
+    run_git_command(command + [repo_url, repo_path])
+
+
+# Fetch the new commits of an existing clone and move its branch to them. A partial clone keeps
+# its filter (remote.origin.partialclonefilter), so the fetch does not download blobs either.
+def update_repository(repo_path, depth=None):
+    command = http_options + ["-C", repo_path, "fetch", "--quiet", "--prune", "origin"]
+    if depth:
+        command += ["--depth", str(depth)]
+    run_git_command(command)
+
+    try:
+        upstream = run_git_command(["-C", repo_path, "rev-parse", "--abbrev-ref", "@{upstream}"]).strip()
+    except RuntimeError:
+        # Detached HEAD or a branch without upstream, leave it where it is
+        return
+
+    # Clones without a working tree have no index, so only the branch has to move
+    has_worktree = os.path.exists(os.path.join(repo_path, ".git", "index"))
+    run_git_command(["-C", repo_path, "reset", "--quiet", "--hard" if has_worktree else "--soft", upstream])
+
+
+# Fetch, in one request, the missing blobs of the files matching pathspec (None for all files) that are
+# changed by the commits selected with rev_args (e.g. ["--all"] or ["old..new"]), or only by the commits
+# in commit_shas. Tools that cannot fetch blobs on demand (RefactoringMiner uses JGit, which does not
+# support partial clones) need them present, and git and PyDriller would otherwise fetch them one
+# commit at a time, with a request to the remote each. Returns the number of blobs fetched.
+def prefetch_blobs(repo_path, rev_args=(), pathspec="*.java", commit_shas=None):
+    if not is_partial_clone(repo_path):
+        return 0
+
+    log_input = objects_input = None
+    objects_args = list(rev_args)
+    if commit_shas is not None:
+        if not commit_shas:
+            return 0
+        rev_args = objects_args = ["--no-walk", "--stdin"]
+        log_input = "".join(f"{commit_sha}\n" for commit_sha in commit_shas)
+        # The parents hold the blobs of the "before" side of the changes
+        objects_input = "".join(f"{commit_sha}\n{commit_sha}^@\n" for commit_sha in commit_shas)
+
+    # Blob ids of the changed files, read from the trees only
+    raw_log = run_git_command(["-C", repo_path, "log", "--format=", "--raw", "--no-abbrev", "--no-renames",
+                               "--root", "-m"] + list(rev_args) + (["--", pathspec] if pathspec else []), log_input)
+    wanted = set()
+    for line in raw_log.splitlines():
+        if line.startswith(":"):
+            fields = line.split(maxsplit=5)
+            wanted.update(blob_sha for blob_sha in fields[2:4] if blob_sha != null_sha)
+
+    # Objects of the selected commits present in the clone, listed without triggering a fetch. Blobs
+    # only reachable from older commits (the "before" side of the first commits) are not listed and
+    # are requested as well, they were usually fetched by the previous run and are small in number.
+    objects = run_git_command(["-C", repo_path, "rev-list", "--objects", "--missing=print", "--no-object-names"]
+                              + objects_args, objects_input)
+    present = {line for line in objects.splitlines() if not line.startswith("?")}
+    missing = sorted(wanted - present)
+    if not missing:
+        return 0
+
+    run_git_command(["-C", repo_path] + http_options
+                    + ["-c", "fetch.negotiationAlgorithm=noop", "fetch", "--quiet", "--no-tags",
+                       "--no-write-fetch-head", "--recurse-submodules=no", "--filter=blob:none", "--stdin",
+                       "origin"], "\n".join(missing) + "\n")
+    return len(missing)
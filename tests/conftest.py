@@ -0,0 +1,18 @@
+import os
+import sys
+import subprocess
+
+# The pipeline modules live at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# Small git repository with `commits` commits changing one Java file, returns its path
+def make_git_repository(path, commits=3):
+    subprocess.run(["git", "init", "--quiet", "--initial-branch=master", path], check=True)
+    for number in range(commits):
+        with open(os.path.join(path, "Main.java"), "w") as file:
+            file.write("public class Main {\n" + "".join(f"    int field{i};\n" for i in range(number + 1)) + "}\n")
+        subprocess.run(["git", "-C", path, "add", "Main.java"], check=True)
+        subprocess.run(["git", "-C", path, "-c", "user.name=Developer", "-c", "user.email=dev@example.com",
+                        "commit", "--quiet", "-m", f"Change {number}"], check=True)
+    return path
@@ -0,0 +1,44 @@
+import subprocess
+from pydriller import RepositoryMining
+from conftest import make_git_repository
+from commit_metadata import read_blob_ids
+from diff_store import diff_key, null_blob
+
+
+def git(repo_path, *args):
+    return subprocess.run(["git", "-C", repo_path, "-c", "user.name=Developer", "-c", "user.email=dev@example.com",
+                           *args], capture_output=True, check=True).stdout.decode().strip()
+
+
+def test_diff_keys_are_the_blob_ids_of_git(tmp_path):
+    repo_path = make_git_repository(str(tmp_path / "repo"), commits=2)
+    # Latin-1 file: PyDriller drops the invalid UTF-8 bytes, so hashing its text gives another id
+    (tmp_path / "repo" / "Latin.java").write_bytes("// Café\nclass Latin {}\n".encode("latin-1"))
+    git(repo_path, "add", "Latin.java")
+    git(repo_path, "commit", "--quiet", "-m", "Add Latin")
+    git(repo_path, "mv", "Main.java", "Renamed.java")
+    (tmp_path / "repo" / "Latin.java").write_bytes("// Café\nclass Latin { int x; }\n".encode("latin-1"))
+    git(repo_path, "commit", "--quiet", "-am", "Rename Main and change Latin")
+    git(repo_path, "rm", "--quiet", "Latin.java")
+    git(repo_path, "commit", "--quiet", "-m", "Delete Latin")
+
+    commits = git(repo_path, "rev-list", "--reverse", "HEAD").split()
+    blob_ids = read_blob_ids(repo_path, commits)
+
+    def blob(commit, path):
+        return git(repo_path, "rev-parse", f"{commit}:{path}")
+
+    assert blob_ids[commits[0]] == {(None, "Main.java"): (None, blob(commits[0], "Main.java"))}
+    assert blob_ids[commits[3]] == {
+        ("Latin.java", "Latin.java"): (blob(commits[2], "Latin.java"), blob(commits[3], "Latin.java")),
+        ("Main.java", "Renamed.java"): (blob(commits[2], "Main.java"), blob(commits[3], "Renamed.java"))
+    }
+    assert blob_ids[commits[4]] == {("Latin.java", None): (blob(commits[3], "Latin.java"), None)}
+
+    # Every file PyDriller reports is found, with the key of its blob pair
+    for commit in RepositoryMining(repo_path).traverse_commits():
+        for modified_file in commit.modifications:
+            key = diff_key(blob_ids[commit.hash].get((modified_file.old_path, modified_file.new_path)),
+                           modified_file.diff)
+            assert not key.startswith("diff-")
+    assert diff_key(blob_ids[commits[4]][("Latin.java", None)], "") == f"{blob(commits[3], 'Latin.java')}..{null_blob}"
@@ -0,0 +1,76 @@
+import os
+import json
+import subprocess
+import random
+from datetime import datetime, timezone
+import pytest
+from conftest import make_git_repository
+from history_index import new_history_index, add_commit_entry, compute_process_metrics, recent_experience_seconds
+
+
+# History of n commits changing 1 to 3 of `files` files; with out_of_order > 0 that share of the
+# commits is dated up to 40 days before the previous one, as happens after rebases
+def random_history(n, files, authors, seed, out_of_order=0.0):
+    rng = random.Random(seed)
+    history_index = new_history_index()
+    timestamp = 1577836800
+    for i in range(n):
+        timestamp += rng.randint(0, 5 * 24 * 3600)
+        date = timestamp - rng.randint(0, 40 * 24 * 3600) if rng.random() < out_of_order else timestamp
+        changes = [(f"src/F{rng.randrange(files)}.java", rng.randint(0, 20), 1) for _ in range(rng.randint(1, 3))]
+        add_commit_entry(history_index, f"{i:040x}", f"author{rng.randrange(authors)}",
+                         datetime.fromtimestamp(date, timezone.utc), changes)
+    return history_index
+
+
+# REXP counted directly from its definition: changes of the same author to the same file, up to
+# and including the commit, dated less than 30 days before it
+def brute_force_rexp(history_index):
+    expected = {}
+    for file_path, file_commits in history_index["files"].items():
+        for i, change in enumerate(file_commits):
+            expected[(change["commit hash"], file_path)] = sum(
+                1 for earlier in file_commits
+                if earlier["position"] <= change["position"] and earlier["author"] == change["author"]
+                and earlier["date"].timestamp() > change["date"].timestamp() - recent_experience_seconds)
+    return expected
+
+
+@pytest.mark.parametrize("files, authors, out_of_order", [(20, 4, 0.0), (20, 4, 0.2), (1, 1, 0.0), (1, 1, 0.3)])
+def test_rexp_matches_brute_force(files, authors, out_of_order):
+    history_index = random_history(600, files, authors, seed=files + authors, out_of_order=out_of_order)
+    metrics = compute_process_metrics(history_index)
+    assert {key: values["REXP"] for key, values in metrics.items()} == brute_force_rexp(history_index)
+
+
+def test_rexp_of_selected_commits():
+    history_index = random_history(300, 5, 3, seed=7)
+    commit_shas = [f"{i:040x}" for i in range(0, 300, 7)]
+    expected = brute_force_rexp(history_index)
+    metrics = compute_process_metrics(history_index, commit_shas)
+    assert metrics and all(values["REXP"] == expected[key] for key, values in metrics.items())
+
+
+def test_commit_window_stops_the_history_walk(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import part3
+    import commit_scope
+    from pipeline_cache import open_cache, load_history_index
+    repo_path = make_git_repository(str(tmp_path / "repo"), commits=4)
+    commits = subprocess.run(["git", "-C", repo_path, "rev-list", "--reverse", "HEAD"], capture_output=True,
+                             text=True, check=True).stdout.split()
+    cache = open_cache(str(tmp_path / "cache.sqlite"))
+    os.makedirs(part3.output_dir, exist_ok=True)
+    with open(os.path.join(part3.output_dir, "repo_refactorings.json"), "w") as file:
+        json.dump({"commits": []}, file)
+
+    monkeypatch.setitem(commit_scope.scope, "to sha", commits[1])
+    part3.compute_repository_metrics("repo", repo_path, cache)
+    assert sorted(load_history_index(cache, "repo")["commits"]) == sorted(commits[:2])
+
+    # A later run without the window walks the rest of the history only
+    monkeypatch.setitem(commit_scope.scope, "to sha", None)
+    part3.compute_repository_metrics("repo", repo_path, cache)
+    history_index = load_history_index(cache, "repo")
+    assert sorted(history_index["commits"]) == sorted(commits)
+    assert history_index["total_commits"] == 4
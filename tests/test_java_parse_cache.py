@@ -0,0 +1,22 @@
+from java_parse_cache import ParseCache
+
+source = "public class Main {\n    public int value() {\n        return 1;\n    }\n}\n"
+
+
+def test_disk_hits_do_not_write_until_flushed(tmp_path):
+    path = str(tmp_path / "parses.sqlite")
+    with ParseCache(path) as cache:
+        first = cache.analyze(source)
+
+    cache = ParseCache(path, memory_items=0)
+    stored_time = cache.conn.execute("SELECT last_used FROM parses").fetchone()[0]
+    changes = cache.conn.total_changes
+    for _ in range(5):
+        assert cache.analyze(source) == first
+    assert cache.hits == 5 and cache.misses == 0
+    assert cache.conn.total_changes == changes  # no write per hit
+
+    cache.close()
+    cache = ParseCache(path)
+    assert cache.conn.execute("SELECT last_used FROM parses").fetchone()[0] > stored_time
+    cache.close()
@@ -0,0 +1,131 @@
+import sys
+import json
+import asyncio
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import pytest
+from conftest import make_git_repository
+from link_harvester import normalize_repo_url, dedupe_repo_urls, extract_repo_links, harvest_links, check_repositories
+
+projects_html = """<html><body>
+<nav><a href="https://github.com/features/actions">Actions</a> <a href="/about">About</a></nav>
+<table class="table">
+<tr><th>Project</th><th>Stars</th></tr>
+<tr><td><a href="https://github.com/square/okhttp">okhttp</a></td><td><a href="https://github.com/square">square</a></td></tr>
+<tr><td><a href="https://github.com/Square/OkHttp/">okhttp again</a></td><td>1</td></tr>
+<tr><td><a href="git@github.com:apache/hive.git">hive</a></td><td>2</td></tr>
+</table>
+</body></html>
+"""
+
+projects_json = {"projects": [{"name": "hive", "url": "https://github.com/apache/hive"},
+                              {"name": "gitlab", "url": "https://gitlab.com/gitlab-org/gitlab-foss.git"},
+                              {"name": "org page", "url": "https://github.com/orgs/apache"}]}
+
+# Single page app: the table is rendered by app.js from data/projects.json. The library loaded
+# from a CDN and the links inside app.js are not project links.
+app_html = """<html><head>
+<script src="https://cdn.example.com/angular.min.js"></script>
+<script src="app.js?v=2"></script>
+</head><body><div ng-view></div></body></html>
+"""
+
+app_js = """// Issues: https://github.com/example/app-framework
+fetch('data/projects.json').then(response => response.json()).then(render);
+"""
+
+projects_text = "See https://bitbucket.org/atlassian/stash-example and https://github.com/JetBrains/kotlin.git.git\n"
+
+
+# Local HTTP server serving the fixture pages, so the tests never reach the network
+@pytest.fixture
+def page_server(tmp_path):
+    (tmp_path / "projects.html").write_text(projects_html)
+    (tmp_path / "projects.json").write_text(json.dumps(projects_json))
+    (tmp_path / "projects.txt").write_text(projects_text)
+    (tmp_path / "app.html").write_text(app_html)
+    (tmp_path / "app.js").write_text(app_js)
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "projects.json").write_text(json.dumps(projects_json))
+
+    handler = partial(SimpleHTTPRequestHandler, directory=str(tmp_path))
+    handler.log_message = lambda *args: None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://github.com/square/okhttp", "https://github.com/square/okhttp.git"),
+    ("https://www.github.com/square/okhttp/", "https://github.com/square/okhttp.git"),
+    ("https://github.com/square/okhttp/tree/master/okhttp", "https://github.com/square/okhttp.git"),
+    ("git@github.com:apache/hive.git", "https://github.com/apache/hive.git"),
+    ("ssh://git@gitlab.com/gitlab-org/gitlab-foss.git", "https://gitlab.com/gitlab-org/gitlab-foss.git"),
+    ("HTTPS://GitHub.com/JetBrains/kotlin.git.git", "https://github.com/JetBrains/kotlin.git"),
+    ("https://github.com/orgs/foo", None),
+    ("https://github.com/orgs/foo/repositories", None),
+    ("https://github.com/features/actions", None),
+    ("https://github.com/topics/java", None),
+    ("https://gitlab.com/explore/projects", None),
+    ("https://github.com/square", None),
+    ("https://github.com/foo/.git", None),
+    ("https://example.com/foo/bar", None),
+])
+def test_normalize_repo_url(url, expected):
+    assert normalize_repo_url(url) == expected
+
+
+def test_dedupe_ignores_case_and_keeps_first_spelling():
+    assert dedupe_repo_urls(["https://github.com/Square/OkHttp", "https://github.com/square/okhttp.git",
+                             "https://github.com/orgs/square"]) == ["https://github.com/Square/OkHttp.git"]
+
+
+def test_html_uses_first_table_column():
+    links = extract_repo_links(projects_html, "https://example.com/")
+    assert dedupe_repo_urls(links) == ["https://github.com/square/okhttp.git", "https://github.com/apache/hive.git"]
+
+
+@pytest.mark.parametrize("use_aiohttp", [True, False])
+def test_harvest_from_local_server(page_server, monkeypatch, use_aiohttp):
+    if use_aiohttp:
+        pytest.importorskip("aiohttp")
+    else:
+        # Importing aiohttp fails, so the urllib fallback is used
+        monkeypatch.setitem(sys.modules, "aiohttp", None)
+
+    links = asyncio.run(harvest_links([f"{page_server}/projects.html", f"{page_server}/projects.json",
+                                       f"{page_server}/projects.txt#/projects", f"{page_server}/missing.html"]))
+    assert links == [
+        "https://github.com/square/okhttp.git",
+        "https://github.com/apache/hive.git",
+        "https://gitlab.com/gitlab-org/gitlab-foss.git",
+        "https://bitbucket.org/atlassian/stash-example.git",
+        "https://github.com/JetBrains/kotlin.git"
+    ]
+
+
+def test_harvest_follows_the_data_documents_of_a_page(page_server):
+    assert asyncio.run(harvest_links([f"{page_server}/app.html#/projects"])) == []
+    assert asyncio.run(harvest_links([f"{page_server}/app.html#/projects"], follow_data=True)) == [
+        "https://github.com/apache/hive.git",
+        "https://gitlab.com/gitlab-org/gitlab-foss.git"
+    ]
+
+
+def test_harvest_reports_unreachable_pages(page_server, capsys):
+    assert asyncio.run(harvest_links([f"{page_server}/missing.html"])) == []
+    assert "Error fetching" in capsys.readouterr().out
+
+
+def test_check_repositories(tmp_path):
+    existing = make_git_repository(str(tmp_path / "existing"), commits=1)
+    missing = str(tmp_path / "missing")
+    checks = asyncio.run(check_repositories([existing, missing], concurrency=2))
+
+    assert list(checks) == [existing, missing]
+    assert len(checks[existing]["head"]) == 40 and checks[existing]["error"] is None
+    assert checks[missing]["head"] is None and checks[missing]["error"]
@@ -0,0 +1,108 @@
+import os
+import json
+import time
+from conftest import make_git_repository
+import orchestrator
+from orchestrator import run_pipeline, clone_stage, load_status
+
+
+def write_stage(repo_url, repo_name, repo_path, cache):
+    with open(os.path.join(repo_path, "stage-output"), "w") as file:
+        file.write(repo_name)
+
+
+def failing_stage(repo_url, repo_name, repo_path, cache):
+    if repo_name == "repo1":
+        raise ValueError("broken repository")
+
+
+def crashing_stage(repo_url, repo_name, repo_path, cache):
+    if repo_name == "repo2":
+        # Like a worker killed for using too much memory: no exception, the process is gone
+        os._exit(9)
+
+
+def timed_mine_stage(repo_url, repo_name, repo_path, cache):
+    start = time.time()
+    time.sleep(0.3)
+    with open(os.path.join(repo_path, "mine-times"), "w") as file:
+        file.write(f"{start} {time.time()} {orchestrator.miner_permits}")
+
+
+test_stages = [("clone", clone_stage), ("fail", failing_stage), ("mine", crashing_stage), ("write", write_stage)]
+
+
+def run_on_repositories(tmp_path, count, **kwargs):
+    repo_urls = [make_git_repository(str(tmp_path / "sources" / f"repo{i}"), commits=2) for i in range(count)]
+    status_path = str(tmp_path / "status.json")
+    status = run_pipeline(repo_urls, path_to_status_file=status_path, repo_clone_dir=str(tmp_path / "clones"),
+                          cache_path=str(tmp_path / "cache.sqlite"), **kwargs)
+    return repo_urls, status, status_path
+
+
+def test_one_crash_or_error_only_fails_its_repository(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    repo_urls, status, status_path = run_on_repositories(tmp_path, 5, workers=2, stages=test_stages)
+
+    assert {repo: result["status"] for repo, result in status.items()} == {
+        "repo0": "done", "repo1": "failed", "repo2": "failed", "repo3": "done", "repo4": "done"}
+    assert status["repo1"]["failed stage"] == "fail"
+    assert "broken repository" in status["repo1"]["error"]
+    assert "crashed" in status["repo2"]["error"]
+    assert load_status(status_path) == status
+    for repo in ("repo0", "repo3", "repo4"):
+        with open(tmp_path / "clones" / repo / "stage-output") as file:
+            assert file.read() == repo
+
+
+def test_crash_inside_the_miner_slot_gives_the_slot_back(tmp_path, monkeypatch):
+    # With a single miner slot, a slot lost by the crashed process would block every later repository
+    monkeypatch.chdir(tmp_path)
+    repo_urls, status, status_path = run_on_repositories(tmp_path, 4, workers=1, stages=test_stages,
+                                                         memory_per_miner_mb=10 ** 9)
+    assert [status[f"repo{i}"]["status"] for i in range(4)] == ["done", "failed", "failed", "done"]
+
+
+def test_mine_stage_takes_one_permit_per_jvm(tmp_path, monkeypatch):
+    # Memory for two JVMs: repositories mining with two JVMs each never mine at the same time
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(orchestrator, "get_available_memory_mb", lambda: 2 * 1000)
+    repo_urls, status, status_path = run_on_repositories(tmp_path, 3, workers=3, stages=[
+        ("clone", clone_stage), ("mine", timed_mine_stage)], memory_per_miner_mb=1000, miners_per_repository=2)
+    assert all(result["status"] == "done" for result in status.values())
+
+    times = []
+    for repo in status:
+        with open(tmp_path / "clones" / repo / "mine-times") as file:
+            start, end, permits = file.read().split()
+        assert permits == "2"
+        times.append((float(start), float(end)))
+    times.sort()
+    assert all(end <= next_start for (_, end), (next_start, _) in zip(times, times[1:]))
+
+
+def test_done_repositories_are_skipped_on_the_next_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    repo_urls, status, status_path = run_on_repositories(tmp_path, 3, workers=3, stages=test_stages)
+    first_times = {repo: result["updated at"] for repo, result in status.items()}
+
+    status = run_pipeline(repo_urls, workers=3, stages=test_stages, path_to_status_file=status_path,
+                          repo_clone_dir=str(tmp_path / "clones"), cache_path=str(tmp_path / "cache.sqlite"))
+    assert status["repo0"]["updated at"] == first_times["repo0"]
+    assert status["repo1"]["updated at"] != first_times["repo1"]
+
+
+def test_default_stages_with_fake_miner(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import part2
+    from refactoring_miner import FakeMiner
+    monkeypatch.setattr(part2, "miner", FakeMiner())
+    os.makedirs(part2.output_dir, exist_ok=True)
+
+    repo_urls, status, status_path = run_on_repositories(tmp_path, 2, workers=2)
+    assert all(result["status"] == "done" for result in status.values()), json.dumps(status, indent=4)
+    for repo in ("repo0", "repo1"):
+        assert os.path.exists(tmp_path / "rminer-outputs" / f"{repo}_refactorings.json")
+        with open(tmp_path / "rminer-outputs" / f"{repo}_metrics.json") as file:
+            metrics = json.load(file)
+        assert metrics and all(row["NDEV"] == 1 for row in metrics)
@@ -0,0 +1,153 @@
+import os
+import time
+import subprocess
+import pytest
+from refactoring_miner import FakeMiner, split_commit_ranges, mine_ranges
+from pipeline_cache import open_cache, get_last_head, load_refactoring_shas
+
+
+def git(repo_path, *args):
+    return subprocess.run(["git", "-C", repo_path, "-c", "user.name=Developer", "-c", "user.email=dev@example.com"]
+                          + list(args), check=True, capture_output=True, text=True).stdout.strip()
+
+
+def commit(repo_path, name):
+    with open(os.path.join(repo_path, f"{name}.java"), "w") as file:
+        file.write(f"class {name} {{}}\n")
+    git(repo_path, "add", ".")
+    git(repo_path, "commit", "--quiet", "-m", name)
+    return git(repo_path, "rev-parse", "HEAD")
+
+
+# History with two side branches merged into master:
+#   root - m1 - m2 - merge(a) - m3 - m4 - merge(b) - m5
+#            \- a1 - a2 /   \- b1 - b2 - b3 /
+@pytest.fixture
+def branched_repo(tmp_path):
+    repo_path = str(tmp_path / "repo")
+    subprocess.run(["git", "init", "--quiet", "--initial-branch=master", repo_path], check=True)
+    commits = {"root": commit(repo_path, "Root"), "m1": commit(repo_path, "M1")}
+    git(repo_path, "checkout", "--quiet", "-b", "a")
+    commits["a1"], commits["a2"] = commit(repo_path, "A1"), commit(repo_path, "A2")
+    git(repo_path, "checkout", "--quiet", "master")
+    commits["m2"] = commit(repo_path, "M2")
+    git(repo_path, "merge", "--quiet", "--no-ff", "-m", "merge a", "a")
+    commits["b0"] = git(repo_path, "rev-parse", "HEAD")
+    git(repo_path, "checkout", "--quiet", "-b", "b")
+    commits["b1"], commits["b2"], commits["b3"] = commit(repo_path, "B1"), commit(repo_path, "B2"), commit(repo_path, "B3")
+    git(repo_path, "checkout", "--quiet", "master")
+    commits["m3"], commits["m4"] = commit(repo_path, "M3"), commit(repo_path, "M4")
+    git(repo_path, "merge", "--quiet", "--no-ff", "-m", "merge b", "b")
+    commits["m5"] = commit(repo_path, "M5")
+    return repo_path, commits
+
+
+def rev_list(repo_path, rev_range):
+    return git(repo_path, "rev-list", rev_range).split()
+
+
+@pytest.mark.parametrize("range_size", [1, 2, 3, 100])
+@pytest.mark.parametrize("start_name", [None, "m1", "b0"])
+def test_split_commit_ranges_covers_every_commit_once(branched_repo, range_size, start_name):
+    repo_path, commits = branched_repo
+    start = commits[start_name] if start_name else None
+    ranges = split_commit_ranges(repo_path, start, "HEAD", range_size)
+
+    covered = [sha for range_start, range_end in ranges for sha in rev_list(repo_path, f"{range_start}..{range_end}")]
+    expected = rev_list(repo_path, f"{start}..HEAD" if start else "HEAD")
+    if start is None:
+        expected.remove(commits["root"])  # never mined, it has no parent
+    assert len(covered) == len(set(covered))
+    assert set(covered) == set(expected)
+
+
+def test_split_commit_ranges_of_empty_range(branched_repo):
+    repo_path, commits = branched_repo
+    assert split_commit_ranges(repo_path, commits["m5"], commits["m5"], 10) == []
+
+
+# FakeMiner whose first range is the slowest, so the ranges finish in reverse order
+class SlowFirstMiner(FakeMiner):
+    def mine(self, repo_path, start, end, output_file):
+        if not self.calls:
+            time.sleep(0.3)
+        return super().mine(repo_path, start, end, output_file)
+
+
+# FakeMiner failing on one range
+class FailingMiner(FakeMiner):
+    def __init__(self, failing_start):
+        super().__init__()
+        self.failing_start = failing_start
+
+    def mine(self, repo_path, start, end, output_file):
+        if start == self.failing_start:
+            raise RuntimeError("JVM ran out of memory")
+        return super().mine(repo_path, start, end, output_file)
+
+
+def history_order(repo_path, ranges):
+    miner = FakeMiner()
+    return [c["sha1"] for start, end in ranges for c in miner.mine(repo_path, start, end, None)]
+
+
+@pytest.fixture
+def part2_in(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import part2
+    monkeypatch.setattr(part2, "output_dir", str(tmp_path))
+    monkeypatch.setattr(part2, "miner_range_size", 2)
+    return part2
+
+
+def test_concurrent_ranges_are_cached_in_history_order(branched_repo, part2_in, tmp_path, monkeypatch):
+    repo_path, commits = branched_repo
+    miner = SlowFirstMiner()
+    monkeypatch.setattr(part2_in, "miner", miner)
+    monkeypatch.setattr(part2_in, "miner_workers", 4)
+
+    progress = []
+    set_last_head = part2_in.set_last_head
+    monkeypatch.setattr(part2_in, "set_last_head", lambda cache, repo, stage, head: (
+        progress.append(head), set_last_head(cache, repo, stage, head)))
+
+    cache = open_cache(str(tmp_path / "cache.sqlite"))
+    part2_in.mine_commit_range("repo", repo_path, cache, "mining", None, commits["m5"])
+
+    ranges = split_commit_ranges(repo_path, None, commits["m5"], 2)
+    assert len(ranges) > 2
+    assert load_refactoring_shas(cache, "repo") == history_order(repo_path, ranges)
+    assert progress == [end for start, end in ranges]
+    assert get_last_head(cache, "repo", "mining") == commits["m5"]
+
+
+def test_resume_after_a_failed_middle_range(branched_repo, part2_in, tmp_path, monkeypatch):
+    repo_path, commits = branched_repo
+    ranges = split_commit_ranges(repo_path, None, commits["m5"], 2)
+    monkeypatch.setattr(part2_in, "miner", FailingMiner(failing_start=ranges[1][0]))
+    monkeypatch.setattr(part2_in, "miner_workers", 3)
+    cache = open_cache(str(tmp_path / "cache.sqlite"))
+
+    with pytest.raises(RuntimeError, match="1 of"):
+        part2_in.mine_commit_range("repo", repo_path, cache, "mining", None, commits["m5"])
+    # Ranges after the failed one are not kept, the progress stops before it
+    assert get_last_head(cache, "repo", "mining") == ranges[0][1]
+    assert load_refactoring_shas(cache, "repo") == history_order(repo_path, ranges[:1])
+
+    # The next run starts from the saved progress and only mines the remaining ranges
+    miner = FakeMiner()
+    monkeypatch.setattr(part2_in, "miner", miner)
+    part2_in.mine_commit_range("repo", repo_path, cache, "mining", get_last_head(cache, "repo", "mining"),
+                               commits["m5"])
+    assert sorted(miner.calls) == sorted(ranges[1:])
+    assert load_refactoring_shas(cache, "repo") == history_order(repo_path, ranges)
+
+
+def test_mine_ranges_reports_every_failure(branched_repo):
+    repo_path, commits = branched_repo
+    ranges = split_commit_ranges(repo_path, None, commits["m5"], 1)
+    results = []
+    with pytest.raises(RuntimeError, match=f"1 of {len(ranges)} commit ranges failed"):
+        for index, found in mine_ranges(FailingMiner(ranges[2][0]), repo_path, ranges, workers=2):
+            results.append(index)
+    assert sorted(results) == [i for i in range(len(ranges)) if i != 2]
@@ -0,0 +1,110 @@
+import os
+import glob
+import subprocess
+import pytest
+from conftest import make_git_repository
+from repo_clone import clone_repository, update_repository, update_reference_store, prefetch_blobs, is_partial_clone
+
+
+def git(repo_path, *args):
+    return subprocess.run(["git", "-C", repo_path, "-c", "user.name=Developer", "-c", "user.email=dev@example.com"]
+                          + list(args), check=True, capture_output=True, text=True).stdout.strip()
+
+
+def pack_count(repo_path):
+    return len(glob.glob(os.path.join(repo_path, ".git", "objects", "pack", "*.pack")))
+
+
+# Bare repository served over file://, allowing the partial clone filter and fetches of single blobs
+@pytest.fixture
+def remote(tmp_path):
+    work_path = make_git_repository(str(tmp_path / "work"), commits=5)
+    bare_path = str(tmp_path / "remote.git")
+    subprocess.run(["git", "clone", "--quiet", "--bare", work_path, bare_path], check=True)
+    git(bare_path, "config", "uploadpack.allowFilter", "true")
+    git(bare_path, "config", "uploadpack.allowAnySHA1InWant", "true")
+    git(work_path, "remote", "add", "origin", bare_path)
+    return work_path, bare_path
+
+
+def test_blobless_clone_prefetches_in_one_request(remote, tmp_path):
+    work_path, bare_path = remote
+    clone_path = str(tmp_path / "clone")
+    clone_repository(bare_path, clone_path, "blobless")
+
+    assert is_partial_clone(clone_path)
+    assert pack_count(clone_path) == 1
+    assert prefetch_blobs(clone_path, ["HEAD"], pathspec=None) == 5
+    assert pack_count(clone_path) == 2
+    assert prefetch_blobs(clone_path, ["HEAD"], pathspec=None) == 0
+    assert pack_count(clone_path) == 2
+
+    # Every blob is present now: reading the whole history fetches nothing more
+    git(clone_path, "log", "--patch", "HEAD")
+    assert pack_count(clone_path) == 2
+
+
+def test_prefetch_of_given_commits(remote, tmp_path):
+    work_path, bare_path = remote
+    clone_path = str(tmp_path / "clone")
+    clone_repository(bare_path, clone_path, "blobless")
+
+    # The commit's file and its version in the parent
+    assert prefetch_blobs(clone_path, pathspec="*.java", commit_shas=[git(clone_path, "rev-parse", "HEAD")]) == 2
+
+
+def test_full_clone_is_not_partial(remote, tmp_path):
+    work_path, bare_path = remote
+    clone_path = str(tmp_path / "clone")
+    clone_repository(bare_path, clone_path)
+    assert not is_partial_clone(clone_path)
+    assert prefetch_blobs(clone_path, ["HEAD"], pathspec=None) == 0
+
+
+@pytest.mark.parametrize("mode", ["full", "blobless"])
+def test_existing_clone_picks_up_new_commits(remote, tmp_path, mode):
+    work_path, bare_path = remote
+    clone_path = str(tmp_path / "clone")
+    clone_repository(bare_path, clone_path, mode)
+
+    with open(os.path.join(work_path, "New.java"), "w") as file:
+        file.write("class New {}\n")
+    git(work_path, "add", "New.java")
+    git(work_path, "commit", "--quiet", "-m", "Add New")
+    git(work_path, "push", "--quiet", "origin", "master")
+
+    clone_repository(bare_path, clone_path, mode)
+    assert git(clone_path, "rev-parse", "HEAD") == git(work_path, "rev-parse", "HEAD")
+    assert is_partial_clone(clone_path) == (mode == "blobless")
+
+    # Nothing new: the update is a no-op
+    update_repository(clone_path)
+    assert git(clone_path, "rev-parse", "HEAD") == git(work_path, "rev-parse", "HEAD")
+
+
+def test_shallow_clone_keeps_depth_commits(remote, tmp_path):
+    work_path, bare_path = remote
+    clone_path = str(tmp_path / "clone")
+    clone_repository(bare_path, clone_path, "shallow", depth=2)
+
+    assert git(clone_path, "rev-parse", "--is-shallow-repository") == "true"
+    assert git(clone_path, "rev-list", "--count", "HEAD") == "2"
+
+
+def test_reference_store_is_used_through_alternates(remote, tmp_path):
+    work_path, bare_path = remote
+    reference_path = str(tmp_path / "shared.git")
+    update_reference_store(reference_path, "remote", bare_path)
+    assert git(reference_path, "rev-parse", "refs/remotes/remote/master") == git(work_path, "rev-parse", "HEAD")
+
+    clone_path = str(tmp_path / "clone")
+    clone_repository(bare_path, clone_path, reference=reference_path)
+    with open(os.path.join(clone_path, ".git", "objects", "info", "alternates")) as file:
+        alternates = file.read().split()
+    assert [os.path.realpath(path) for path in alternates] == [os.path.realpath(os.path.join(reference_path, "objects"))]
+    assert pack_count(clone_path) == 0  # every object comes from the reference store
+
+
+def test_unknown_mode(tmp_path):
+    with pytest.raises(ValueError):
+        clone_repository(str(tmp_path), str(tmp_path / "clone"), "sparse")
@@ -0,0 +1,214 @@
+import subprocess
+from commit_metadata import CommitMetadataReader
+
+# Id of the empty tree, used to diff the first measured commit against
+empty_tree = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+
+
+def simple_name(name):
+    return name.rsplit(".", 1)[-1]
+
+
+# Repository-wide index of the declared Java types (class -> superclass, interfaces and
+# referenced types). It is updated file by file, and names are resolved through the package
+# and imports of the file that uses them, so DIT, NOC and CBO are answered without re-parsing.
+class TypeIndex:
+    def __init__(self):
+        self.file_types = {}  # file path -> qualified names declared in the file
+        self.types = {}  # qualified name -> type entry
+        self.simple_names = {}  # simple name -> qualified names declared with it
+        self.subclasses = {}  # simple name of a superclass -> qualified names of classes extending it
+        self.referenced_by = {}  # simple name of a referenced type -> qualified names referring to it
+
+    def remove_file(self, file_path):
+        for qualified_name in self.file_types.pop(file_path, []):
+            entry = self.types.pop(qualified_name)
+            self.simple_names[entry["name"]].discard(qualified_name)
+            if entry["superclass"]:
+                self.subclasses[simple_name(entry["superclass"])].discard(qualified_name)
+            for reference in entry["references"]:
+                self.referenced_by[simple_name(reference)].discard(qualified_name)
+
+    # Replace the types declared by a file with the ones of its new analysis
+    def update_file(self, file_path, analysis):
+        self.remove_file(file_path)
+        if "error" in analysis:
+            return
+
+        package = analysis["package"]
+        declared = []
+        for type_info in analysis["types"]:
+            qualified_name = f"{package}.{type_info['name']}" if package else type_info["name"]
+            if qualified_name in self.types:  # Same type declared twice (e.g. a duplicated file)
+                continue
+
+            entry = dict(type_info, package=package, imports=analysis["imports"], path=file_path)
+            self.types[qualified_name] = entry
+            self.simple_names.setdefault(entry["name"], set()).add(qualified_name)
+            if entry["superclass"]:
+                self.subclasses.setdefault(simple_name(entry["superclass"]), set()).add(qualified_name)
+            for reference in entry["references"]:
+                self.referenced_by.setdefault(simple_name(reference), set()).add(qualified_name)
+            declared.append(qualified_name)
+
+        self.file_types[file_path] = declared
+
+    # Qualified name of a type used in the given entry, or None if it is not declared in the repository
+    def resolve(self, name, entry):
+        if name in self.types:
+            return name
+
+        for imported in entry["imports"]:
+            if not imported["wildcard"] and simple_name(imported["path"]) == name.split(".")[0]:
+                candidate = imported["path"] + name[len(name.split(".")[0]):]
+                return candidate if candidate in self.types else None
+
+        candidates = [f"{entry['package']}.{name}" if entry["package"] else name]
+        candidates += [f"{imported['path']}.{name}" for imported in entry["imports"] if imported["wildcard"]]
+        for candidate in candidates:
+            if candidate in self.types:
+                return candidate
+
+        # Fall back to the simple name when it is unique in the repository
+        declared = self.simple_names.get(simple_name(name), set())
+        return next(iter(declared)) if len(declared) == 1 else None
+
+    # Depth of inheritance: 1 for a class without superclass, +1 for each superclass.
+    # A superclass outside the repository counts as one more level.
+    def dit(self, qualified_name):
+        depth = 1
+        seen = {qualified_name}
+        entry = self.types.get(qualified_name)
+        while entry is not None and entry["superclass"]:
+            depth += 1
+            parent = self.resolve(entry["superclass"], entry)
+            if parent is None or parent in seen:
+                break
+            seen.add(parent)
+            entry = self.types[parent]
+        return depth
+
+    # Number of direct subclasses declared in the repository
+    def noc(self, qualified_name):
+        candidates = self.subclasses.get(simple_name(qualified_name), set())
+        return sum(1 for child in candidates
+                   if self.resolve(self.types[child]["superclass"], self.types[child]) == qualified_name)
+
+    # Coupling between objects: other repository types this type uses or is used by
+    def cbo(self, qualified_name):
+        entry = self.types.get(qualified_name)
+        if entry is None:
+            return 0
+
+        coupled = {self.resolve(reference, entry) for reference in entry["references"]}
+        for user in self.referenced_by.get(simple_name(qualified_name), set()):
+            user_entry = self.types[user]
+            if any(self.resolve(reference, user_entry) == qualified_name for reference in user_entry["references"]):
+                coupled.add(user)
+
+        coupled.discard(None)
+        coupled.discard(qualified_name)
+        return len(coupled)
+
+    # DIT, NOC and CBO of the measured class of a file (zeros if the file declares no class)
+    def file_metrics(self, file_path, analysis):
+        measured_class = analysis.get("measured class")
+        if not measured_class:
+            return {"DIT": 0, "NOC": 0, "CBO": 0}
+
+        package = analysis["package"]
+        qualified_name = f"{package}.{measured_class}" if package else measured_class
+        if qualified_name not in self.file_types.get(file_path, []):
+            return {"DIT": 0, "NOC": 0, "CBO": 0}
+        return {"DIT": self.dit(qualified_name), "NOC": self.noc(qualified_name), "CBO": self.cbo(qualified_name)}
+
+
+def run_git(repo_path, args, stdin_text=None):
+    result = subprocess.run(["git", "-C", repo_path] + args, input=stdin_text, capture_output=True, text=True,
+                            encoding='utf-8')
+    if result.returncode != 0:
+        raise RuntimeError(f"git {args[0]} failed in {repo_path}: {result.stderr}")
+    return result.stdout
+
+
+# .java files added or modified by each commit (compared to its first parent), in one git process
+def modified_java_files(repo_path, commit_shas):
+    output = run_git(repo_path, ["diff-tree", "--stdin", "-r", "--root", "--no-renames", "--name-only",
+                                 "--diff-filter=AM", "--", "*.java"], "\n".join(commit_shas) + "\n")
+    modified = {commit_sha: [] for commit_sha in commit_shas}
+    current = None
+    for line in output.splitlines():
+        if line in modified:
+            current = line
+        elif line and current:
+            modified[current].append(line)
+    return modified
+
+
+def parse_raw_change(line):
+    meta, _, file_path = line.partition("\t")
+    new_blob, status = meta.split()[3], meta.split()[4]
+    return file_path, None if status == "D" else new_blob
+
+
+# .java blobs that differ between each pair of commits (from, to), in one git process for all pairs.
+# Returns {to commit: [(path, new blob SHA or None if deleted)]}; from may be the empty tree.
+def changed_java_blobs(repo_path, commit_pairs):
+    changes = {to_commit: [] for _, to_commit in commit_pairs}
+    lines = []
+    for from_commit, to_commit in commit_pairs:
+        if from_commit == empty_tree:
+            # diff-tree --stdin takes "<commit> <parent>" lines, the empty tree is not a commit
+            output = run_git(repo_path, ["diff-tree", "-r", "--no-renames", from_commit, to_commit, "--", "*.java"])
+            changes[to_commit] = [parse_raw_change(line) for line in output.splitlines()]
+        else:
+            lines.append(f"{to_commit} {from_commit}")
+    if not lines:
+        return changes
+
+    # Each diff starts with a line holding the first commit of its input line
+    output = run_git(repo_path, ["diff-tree", "--stdin", "-r", "--no-renames", "--", "*.java"], "\n".join(lines) + "\n")
+    current = None
+    for line in output.splitlines():
+        if line.startswith(":"):
+            changes[current].append(parse_raw_change(line))
+        elif line:
+            current = line.split()[0]
+    return changes
+
+
+# Compute DIT, NOC and CBO for the .java files modified by each of the given commits.
+# The commits are visited in topological order and the type index is moved from one commit
+# to the next by applying only the .java blobs that differ between them, so the whole tree
+# is only parsed for the first commit (and blobs seen before come from the parse cache).
+# Returns {commit sha: {file path: {"DIT", "NOC", "CBO"}}}.
+def compute_type_metrics(repo_path, commit_shas, parse_cache):
+    if not commit_shas:
+        return {}
+
+    wanted = set(commit_shas)
+    ordered = [c for c in run_git(repo_path, ["rev-list", "--topo-order", "--reverse", "--all"]).split() if c in wanted]
+    ordered_set = set(ordered)
+    ordered += [c for c in commit_shas if c not in ordered_set]
+    modified = modified_java_files(repo_path, ordered)
+    changed = changed_java_blobs(repo_path, list(zip([empty_tree] + ordered[:-1], ordered)))
+
+    type_index = TypeIndex()
+    analyses = {}  # file path -> analysis of its current blob
+    type_metrics = {}
+
+    with CommitMetadataReader(repo_path) as reader:
+        for commit_sha in ordered:
+            for file_path, blob_sha in changed[commit_sha]:
+                if blob_sha is None:
+                    type_index.remove_file(file_path)
+                    analyses.pop(file_path, None)
+                else:
+                    analysis = parse_cache.analyze_blob(blob_sha, lambda: reader.read_blob(blob_sha))
+                    type_index.update_file(file_path, analysis)
+                    analyses[file_path] = analysis
+
+            type_metrics[commit_sha] = {file_path: type_index.file_metrics(file_path, analyses[file_path])
+                                        for file_path in modified[commit_sha] if file_path in analyses}
+
+    return type_metrics